@@ -0,0 +1,236 @@
+'''
+contains methods to save the full state of a simulation to a checkpoint
+file and to restore it, so interrupted runs can be resumed
+'''
+
+import heapq
+import json
+import os
+
+import numpy as np
+
+from config import Configuration
+from infection import Recovery_scheduler
+from network import Contact_network
+from parallel import Tile_pool
+from population import Population_trackers, Population_index, Destination_registry,\
+Households
+from schedules import Daily_schedule
+
+#bumped when the layout of checkpoint files changes
+CHECKPOINT_VERSION = 1
+
+
+def to_json_value(value):
+    '''converts numpy scalars for json.dumps'''
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError('%s cannot be stored in a checkpoint' %type(value))
+
+
+def save_checkpoint(sim, path):
+    '''saves everything needed to resume a simulation bit-identically
+
+    Everything is written to a single compressed .npz file: the population,
+    its index, destinations, trackers, recovery schedule, households,
+    contact network, daily schedule, the frame and the Configuration (as
+    json, arrays such as the lockdown vector as arrays), and the state of
+    numpy's global random number generator and of the generator of the
+    fused motion step. The file is first written next to path and then
+    moved over it, so an interrupted save never leaves a broken checkpoint.
+
+    The numba backend keeps a random state numpy cannot read. After
+    restoring, its kernels are seeded anew, so such runs resume correctly
+    but not bit-identically.
+
+    Keyword arguments
+    -----------------
+    sim : Simulation
+        the simulation to save
+
+    path : str
+        the file to write to, usually ending in .npz
+    '''
+
+    arrays = {}
+    meta = {'version': CHECKPOINT_VERSION,
+            'frame': sim.frame,
+            'run_step': sim.run_step}
+
+    arrays['population'] = sim.population
+
+    #the order of the index sets decides the order of random draws
+    index_sets = sim.pop_index.states + [sim.pop_index.treatment, sim.pop_index.destination]
+    for i, index_set in enumerate(index_sets):
+        arrays['index_%i' %i] = index_set.indices
+
+    if isinstance(sim.destinations, Destination_registry):
+        meta['destinations'] = 'registry'
+        arrays['destination_centers'] = sim.destinations.centers
+        arrays['destination_wander_ranges'] = sim.destinations.wander_ranges
+    else:
+        meta['destinations'] = 'matrix'
+        arrays['destinations'] = sim.destinations
+
+    tracker = sim.pop_tracker
+    arrays['tracker_counts'] = tracker.counts[:tracker.length]
+    arrays['tracker_cohort_counts'] = tracker.cohort_counts[:tracker.length]
+    meta['tracker'] = {'cohort_size': tracker.cohort_size,
+                       'peak_infectious': tracker.peak_infectious,
+                       'peak_infectious_frame': tracker.peak_infectious_frame,
+                       'cumulative_infectious': tracker.cumulative_infectious,
+                       'reinfect': tracker.reinfect}
+
+    #recovery buckets as one ID array, with the due frame of every ID
+    frames = sorted(sim.recovery_scheduler.buckets.keys())
+    buckets = [np.concatenate(sim.recovery_scheduler.buckets[frame]) for frame in frames]
+    arrays['recovery_ids'] = np.concatenate(buckets) if len(buckets) > 0 else np.zeros((0,), dtype=np.int32)
+    arrays['recovery_frames'] = np.repeat(np.array(frames, dtype=np.int64),
+                                          [len(bucket) for bucket in buckets])
+
+    if sim.households is not None:
+        arrays['household_offsets'] = sim.households.offsets
+        arrays['household_members'] = sim.households.members
+
+    if sim.network is not None:
+        arrays['network_offsets'] = sim.network.offsets
+        arrays['network_neighbours'] = sim.network.neighbours
+
+    if sim.schedule is not None:
+        arrays['schedule_templates'] = sim.schedule.templates
+        arrays['schedule_assignment'] = sim.schedule.assignment
+        meta['schedule'] = {'slot_length': sim.schedule.slot_length,
+                            'current_slot': sim.schedule.current_slot}
+
+    #random number generators
+    _, keys, position, has_gauss, cached_gaussian = np.random.get_state()
+    arrays['legacy_rng_keys'] = keys
+    meta['legacy_rng'] = {'position': position, 'has_gauss': has_gauss,
+                          'cached_gaussian': cached_gaussian}
+    meta['rng'] = sim.rng.bit_generator.state if sim.rng is not None else None
+    meta['tile_seed'] = sim.tile_pool.seed if sim.tile_pool is not None else None
+
+    #configuration, with arrays stored as arrays
+    config = {}
+    for key, value in sim.Config.__dict__.items():
+        if isinstance(value, np.ndarray):
+            arrays['config_%s' %key] = value
+        else:
+            config[key] = value
+    meta['config'] = config
+
+    arrays['meta'] = np.array(json.dumps(meta, default = to_json_value))
+
+    #write next to the target, then swap it in
+    temp_path = '%s.tmp' %path
+    with open(temp_path, 'wb') as checkpoint_file:
+        np.savez_compressed(checkpoint_file, **arrays)
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+    os.replace(temp_path, path)
+
+
+def restore_checkpoint(sim, path):
+    '''restores the state of a simulation from a checkpoint file
+
+    Replaces the configuration and all state of sim with those saved by
+    save_checkpoint, including the state of numpy's global random number
+    generator. Use Simulation.from_checkpoint to make a new simulation from
+    a checkpoint.
+
+    Keyword arguments
+    -----------------
+    sim : Simulation
+        the simulation to restore into
+
+    path : str
+        the checkpoint file to read
+    '''
+
+    with np.load(path, allow_pickle = False) as checkpoint:
+        arrays = {key: checkpoint[key] for key in checkpoint.files}
+
+    meta = json.loads(str(arrays.pop('meta')))
+    if meta['version'] != CHECKPOINT_VERSION:
+        raise ValueError('checkpoint version %s not supported, expected %i'
+                         %(meta['version'], CHECKPOINT_VERSION))
+
+    sim.Config = Configuration()
+    sim.Config.__dict__.update(meta['config'])
+    for key in arrays:
+        if key.startswith('config_'):
+            sim.Config.__dict__[key[len('config_'):]] = arrays[key]
+
+    sim.frame = meta['frame']
+    sim.run_step = meta['run_step']
+
+    sim.population = arrays['population']
+
+    sim.pop_index = Population_index(sim.population)
+    index_sets = sim.pop_index.states + [sim.pop_index.treatment, sim.pop_index.destination]
+    for i, index_set in enumerate(index_sets):
+        index_set.set_members(arrays['index_%i' %i])
+
+    if meta['destinations'] == 'registry':
+        sim.destinations = Destination_registry(0, dtype = arrays['destination_centers'].dtype)
+        sim.destinations.centers = arrays['destination_centers']
+        sim.destinations.wander_ranges = arrays['destination_wander_ranges']
+    else:
+        sim.destinations = arrays['destinations']
+
+    tracker = Population_trackers(sim.Config, meta['tracker']['cohort_size'])
+    length = len(arrays['tracker_counts'])
+    while len(tracker.counts) < length:
+        tracker.grow()
+    tracker.counts[:length] = arrays['tracker_counts']
+    tracker.cohort_counts[:length] = arrays['tracker_cohort_counts']
+    tracker.length = length
+    tracker.peak_infectious = meta['tracker']['peak_infectious']
+    tracker.peak_infectious_frame = meta['tracker']['peak_infectious_frame']
+    tracker.cumulative_infectious = meta['tracker']['cumulative_infectious']
+    tracker.reinfect = meta['tracker']['reinfect']
+    sim.pop_tracker = tracker
+
+    sim.recovery_scheduler = Recovery_scheduler(sim.Config)
+    recovery_frames = arrays['recovery_frames']
+    starts = np.flatnonzero(np.diff(recovery_frames, prepend = -1))
+    for frame, bucket in zip(recovery_frames[starts], np.split(arrays['recovery_ids'], starts[1:])):
+        sim.recovery_scheduler.buckets[int(frame)] = [bucket]
+    sim.recovery_scheduler.scheduled[arrays['recovery_ids']] = True
+    sim.recovery_scheduler.frames = list(sim.recovery_scheduler.buckets.keys())
+    heapq.heapify(sim.recovery_scheduler.frames)
+
+    sim.households = None
+    if 'household_offsets' in arrays:
+        sim.households = Households(arrays['household_offsets'], arrays['household_members'])
+
+    sim.network = None
+    if 'network_offsets' in arrays:
+        sim.network = Contact_network(arrays['network_offsets'], arrays['network_neighbours'])
+
+    sim.schedule = None
+    if 'schedule_templates' in arrays:
+        sim.schedule = Daily_schedule(arrays['schedule_templates'], arrays['schedule_assignment'],
+                                      meta['schedule']['slot_length'])
+        sim.schedule.current_slot = meta['schedule']['current_slot']
+
+    #random number generators
+    legacy = meta['legacy_rng']
+    np.random.set_state(('MT19937', arrays['legacy_rng_keys'], legacy['position'],
+                         legacy['has_gauss'], legacy['cached_gaussian']))
+
+    sim.rng = None
+    if meta['rng'] is not None:
+        bit_generator = getattr(np.random, meta['rng']['bit_generator'])()
+        bit_generator.state = meta['rng']
+        sim.rng = np.random.Generator(bit_generator)
+
+    #scratch arrays are rebuilt on first use, the tile generators only depend on the seed
+    sim.motion_buffers = None
+    sim.kernels_seeded = False
+    sim.tile_pool = None
+    if meta['tile_seed'] is not None:
+        sim.tile_pool = Tile_pool(sim.Config, sim.Config.precision, seed = meta['tile_seed'])
+    sim.fig = None
+
+    return sim
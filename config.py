@@ -19,7 +19,16 @@ class Configuration():
         self.save_pop_freq = kwargs.get('save_pop_freq', 10) #population data will be saved every 'n' timesteps. Default: 10
         self.save_pop_folder = kwargs.get('save_pop_folder', 'pop_data/') #folder to write population timestep data to
         self.endif_no_infections = kwargs.get('endif_no_infections', True) #whether to stop simulation if no infections remain
+        self.checkpoint_freq = kwargs.get('checkpoint_freq', 0) #save a checkpoint every 'n' timesteps, 0 disables checkpoints
+        self.checkpoint_path = kwargs.get('checkpoint_path', 'checkpoint.npz') #file to write checkpoints to, see checkpoint.py
         self.world_size = kwargs.get('world_size', [2, 2]) #x and y sizes of the world
+        #floating point type of the population and destination matrices, 'float64' or 'float32'.
+        #float32 halves memory use and bandwidth, see simulation.validate_precision for its effect.
+        #It holds IDs and frames exactly up to 2^24, larger populations and runs are rejected
+        self.precision = kwargs.get('precision', 'float64')
+        #how destinations are stored, 'matrix' or 'registry'. The matrix holds the coordinates
+        #of every destination for every person, the registry one row per destination
+        self.destination_storage = kwargs.get('destination_storage', 'matrix')
 
 
         #scenario flags
@@ -69,12 +78,44 @@ class Configuration():
         self.wander_range = kwargs.get('wander_range', 0.05)
         self.wander_factor = kwargs.get('wander_factor', 1) 
         self.wander_factor_dest = kwargs.get('wander_factor_dest', 1.5) #area around destination
+        #'default' or 'fused'. The fused motion step bounces, randomizes and moves everyone
+        #in place using preallocated buffers, in stead of building new arrays each step
+        self.motion_engine = kwargs.get('motion_engine', 'default')
+        #'numpy' or 'numba'. The numba backend runs motion, the 'grid' infection search and the
+        #recovery dice rolls as compiled kernels (see numba_kernels.py), falls back to numpy if
+        #numba is not installed. Kernels draw from their own random generator, seeded from numpy's
+        self.backend = kwargs.get('backend', 'numpy')
+        #number of threads to run motion and the 'grid' infection search on, see parallel.py
+        self.threads = kwargs.get('threads', 1)
 
         #infection variables
         self.infection_range = kwargs.get('infection_range', 0.01) #range surrounding sick patient that infections can take place
         self.infection_chance = kwargs.get('infection_chance', 0.03)   #chance that an infection spreads to nearby healthy people each tick
         self.recovery_duration = kwargs.get('recovery_duration', (200, 500)) #how many ticks it may take to recover from the illness
         self.mortality_chance = kwargs.get('mortality_chance', 0.02) #global baseline chance of dying from the disease
+        #how to find infectious agents near healthy ones: 'default' scans the whole population
+        #for every infected (or healthy) person, 'grid' bins agents into cells of infection_range
+        #and only tests the neighbouring cells. 'meanfield' approximates: healthy agents are exposed
+        #to all infectious in their cell of 2 * infection_range, see infection.find_nearby_meanfield.
+        #'network' drops motion altogether and infects along the edges of a static contact network
+        self.infection_engine = kwargs.get('infection_engine', 'default')
+        #contact network variables, used when infection_engine is 'network'
+        self.network_type = kwargs.get('network_type', 'small_world') #'small_world' or 'scale_free'
+        self.network_mean_degree = kwargs.get('network_mean_degree', 10) #average number of contacts per person
+        self.network_rewire_chance = kwargs.get('network_rewire_chance', 0.1) #small world: odds an edge is rewired
+        self.network_exponent = kwargs.get('network_exponent', 2.5) #scale free: exponent of the degree distribution
+        #whether people confined to a destination (arrived, column 12 == 1) infect each other per venue
+        #in stead of by distance: everyone at a venue is exposed to all infectious people there.
+        #Needs destination_storage 'registry', so every destination number is one place
+        self.venue_transmission = kwargs.get('venue_transmission', False)
+        self.venue_infection_chance = kwargs.get('venue_infection_chance', 0.001) #chance per infectious person at the same venue each tick
+        #whether the infectious also infect the members of their household. Those in treatment
+        #or with an active destination (isolating, at a venue) are not at home and do not.
+        #Off by default, so scenarios without households keep their outcomes
+        self.household_transmission = kwargs.get('household_transmission', False)
+        self.household_infection_chance = kwargs.get('household_infection_chance', 0.001) #chance per infectious household member each tick
+        self.mean_household_size = kwargs.get('mean_household_size', 2.5)
+        self.max_household_size = kwargs.get('max_household_size', 6)
 
         #healthcare variables
         self.healthcare_capacity = kwargs.get('healthcare_capacity', 300) #capacity of the healthcare system
@@ -119,6 +160,31 @@ class Configuration():
         else:
             return palettes['regular'][self.plot_style]
 
+    def check_precision(self, rows=None, frames=None):
+        '''raises config_error if Config.precision cannot hold IDs and frames exactly
+
+        IDs (column 0 of the population) and the frame someone got infected
+        (column 8) are stored as floating point numbers, which hold integers
+        exactly only up to 2^24 for float32. Beyond that ID lookups and
+        recovery timing would silently go wrong.
+
+        Keyword arguments
+        -----------------
+        rows : int
+            the number of rows of the population, pop_size if not given
+
+        frames : int
+            the last frame that will be simulated, simulation_steps if not given
+        '''
+        rows = self.pop_size if rows is None else rows
+        frames = self.simulation_steps if frames is None else frames
+        exact = 2 ** (np.finfo(self.precision).nmant + 1)
+
+        if rows > exact or frames > exact:
+            raise config_error('precision %s holds IDs and frames exactly up to %i, got %i people '
+                               'and %i frames. Use precision \'float64\''
+                               %(self.precision, exact, rows, frames))
+
     def get(self, key):
         '''gets key value from config'''
         try:
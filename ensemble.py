@@ -0,0 +1,274 @@
+'''
+contains the ensemble mode, that simulates many stochastic replicas of one
+scenario at once
+'''
+
+import sys
+
+import numpy as np
+
+from config import Configuration
+from infection import count_nearby_grid, find_household_exposed, combine_exposures,\
+recover_or_die
+from population import initialize_population, initialize_households, Households,\
+Population_trackers
+
+
+class Ensemble():
+    '''simulates K replicas of a scenario in one (K, N, 15) array
+
+    Every replica is a population of its own, with its own randomness, but
+    motion, infection, recovery and tracking are computed for all replicas at
+    once on the stacked array, so the cost of interpreting the timestep is
+    paid once per timestep in stead of once per replica. This pays off most
+    for many replicas of small populations.
+
+    Rows of the flattened (K * N, 15) array are numbered replica by replica,
+    and column 0 holds this row number. Infections are found with the 'grid'
+    search, with the replicas placed side by side so they never come within
+    infection range of one another. Outcomes are tracked per replica in
+    pop_trackers, each a Population_trackers as used by Simulation.
+
+    Supported are the scenarios without destinations: free roaming, reduced
+    interaction and lockdown (every replica draws its own lockdown compliance
+    and goes into lockdown by itself), with or without households.
+
+    Keyword arguments
+    -----------------
+    replicas : int
+        the number of replicas, K
+
+    args, kwargs
+        the configuration of the scenario, see Configuration
+    '''
+    def __init__(self, replicas=10, *args, **kwargs):
+        #load default config data
+        self.Config = Configuration(*args, **kwargs)
+        self.replicas = replicas
+        self.frame = 0
+
+        if self.Config.self_isolate:
+            raise ValueError('self-isolation sends people to a destination, which the ensemble does not support')
+        #rows of all replicas are numbered in column 0
+        self.Config.check_precision(rows = replicas * self.Config.pop_size)
+
+        #outcomes per replica, and which replicas still have infections
+        self.pop_trackers = [Population_trackers(self.Config) for _ in range(replicas)]
+        self.active = np.ones((replicas,), dtype=bool)
+
+        self.population_init()
+
+
+    def population_init(self):
+        '''(re-)initializes the populations of all replicas'''
+        pop_size = self.Config.pop_size
+
+        self.population = np.stack([initialize_population(self.Config, self.Config.mean_age,
+                                                          self.Config.max_age, self.Config.xbounds,
+                                                          self.Config.ybounds)
+                                    for _ in range(self.replicas)])
+        self.population[:,:,0] = np.arange(self.replicas * pop_size).reshape((self.replicas, pop_size))
+
+        #each replica draws who complies with a lockdown, as the share set in Config
+        if len(self.Config.lockdown_vector) > 0:
+            non_compliance = np.mean(self.Config.lockdown_vector)
+        else:
+            non_compliance = 1 - self.Config.lockdown_compliance
+        self.complying = np.random.uniform(size=(self.replicas, pop_size)) >= non_compliance
+
+        #households of all replicas, in one structure over the rows of the flattened array
+        self.households = None
+        if self.Config.household_transmission:
+            households = [initialize_households(pop_size, self.Config.mean_household_size,
+                                                self.Config.max_household_size)
+                          for _ in range(self.replicas)]
+            offsets = np.concatenate([h.offsets[:-1] + i * pop_size for i, h in enumerate(households)] +
+                                     [[self.replicas * pop_size]])
+            members = np.concatenate([h.members + i * pop_size for i, h in enumerate(households)])
+            self.households = Households(offsets, members)
+
+        #bin of each row for counting everyone per replica, cohort and state at once
+        self.num_cohorts = self.pop_trackers[0].num_cohorts
+        cohorts = np.clip(np.int64(self.population[:,:,7]) // self.pop_trackers[0].cohort_size,
+                          0, self.num_cohorts - 1)
+        replica_bins = np.arange(self.replicas)[:,np.newaxis] * self.num_cohorts
+        self.cohort_bins = ((replica_bins + cohorts) * 5).ravel()
+
+
+    @property
+    def flat(self):
+        '''the populations of all replicas as one (K * N, 15) matrix, a view'''
+        return self.population.reshape((-1, self.population.shape[2]))
+
+
+    def update_motion(self, lockdown_active):
+        '''moves everyone in all replicas, see motion.update_motion
+
+        Keyword arguments
+        -----------------
+        lockdown_active : ndarray
+            per replica, whether a lockdown is in effect
+        '''
+
+        x = self.population[:,:,1]
+        y = self.population[:,:,2]
+        heading_x = self.population[:,:,3]
+        heading_y = self.population[:,:,4]
+        speeds = self.population[:,:,5]
+
+        xbounds = [self.Config.xbounds[0] + 0.02, self.Config.xbounds[1] - 0.02]
+        ybounds = [self.Config.ybounds[0] + 0.02, self.Config.ybounds[1] - 0.02]
+
+        #out of bounds
+        for position, heading, bounds in [(x, heading_x, xbounds), (y, heading_y, ybounds)]:
+            low = (position <= bounds[0]) & (heading < 0)
+            heading[low] = np.clip(np.random.normal(loc = 0.5, scale = 0.5 / 3, size = np.count_nonzero(low)),
+                                   a_min = 0.05, a_max = 1)
+            high = (position >= bounds[1]) & (heading > 0)
+            heading[high] = np.clip(-np.random.normal(loc = 0.5, scale = 0.5 / 3, size = np.count_nonzero(high)),
+                                    a_min = -1, a_max = -0.05)
+
+        #randomly update headings and speeds, outside of lockdown
+        free = ~lockdown_active[:,np.newaxis]
+        for column, loc, scale in [(heading_x, 0, 1/3), (heading_y, 0, 1/3),
+                                   (speeds, self.Config.speed, self.Config.speed / 3)]:
+            update = (np.random.random(size=column.shape) <= 0.02) & free
+            column[update] = np.random.normal(loc = loc, scale = scale, size = np.count_nonzero(update))
+        speeds[free[:,0]] = np.clip(speeds[free[:,0]], a_min = 0.0001, a_max = 0.05)
+
+        #in lockdown, reduce speed of all members of society and stop those complying
+        speeds[lockdown_active] = np.minimum(speeds[lockdown_active], 0.001)
+        speeds[lockdown_active[:,np.newaxis] & self.complying] = 0
+
+        #the dead stand still
+        dead = self.population[:,:,6] == 3
+        heading_x[dead] = 0
+        heading_y[dead] = 0
+
+        x += heading_x * speeds
+        y += heading_y * speeds
+
+
+    def infect(self):
+        '''finds new infections in all replicas, see infection.infect'''
+
+        flat = self.flat
+        pop_size = self.Config.pop_size
+
+        infected_previous_step = np.flatnonzero(flat[:,6] == 1)
+        sources = infected_previous_step
+        if not self.Config.traveling_infects:
+            sources = sources[flat[sources,11] == 0]
+        targets = np.flatnonzero(flat[:,6] == 0)
+
+        #place the replicas side by side, further apart than the infection range
+        stride = np.ptp(flat[:,1]) + 4 * self.Config.infection_range
+        source_xy = flat[sources][:,1:3]
+        source_xy[:,0] += (sources // pop_size) * stride
+        target_xy = flat[targets][:,1:3]
+        target_xy[:,0] += (targets // pop_size) * stride
+
+        infected_counts = count_nearby_grid(source_xy, target_xy, self.Config.infection_range)
+        exposed = infected_counts > 0
+        indices = targets[exposed]
+        infected_counts = infected_counts[exposed]
+
+        #one die roll per infected patient nearby if less than half of a replica is infected,
+        #otherwise odds scale with the number of infected nearby
+        few_infected = np.bincount(infected_previous_step // pop_size,
+                                   minlength = self.replicas) < (pop_size // 2)
+        infection_odds = np.where(few_infected[indices // pop_size],
+                                  1 - ((1 - self.Config.infection_chance) ** infected_counts),
+                                  self.Config.infection_chance * infected_counts)
+
+        if self.households is not None:
+            household_indices, household_counts = find_household_exposed(flat, self.households)
+            indices, infection_odds = combine_exposures([indices, household_indices],
+                                                        [infection_odds,
+                                                         1 - ((1 - self.Config.household_infection_chance)
+                                                              ** household_counts)])
+
+        #roll all dice in one go, indices are sorted so new infections are grouped by replica
+        new_infections = indices[np.random.random(size=indices.shape) < infection_odds]
+        flat[new_infections,6] = 1
+        flat[new_infections,8] = self.frame
+
+        #admit patients in order, for as long as their replica has healthcare capacity left
+        replica = new_infections // pop_size
+        in_treatment = np.bincount(np.flatnonzero(flat[:,10] == 1) // pop_size, minlength = self.replicas)
+        free_beds = self.Config.healthcare_capacity - in_treatment + 1
+        rank = np.arange(len(new_infections)) - np.searchsorted(replica, replica, side='left')
+        flat[new_infections[rank < free_beds[replica]],10] = 1
+
+
+    def update_counts(self):
+        '''appends the counts of this timestep to the trackers of the active replicas'''
+
+        cohort_counts = np.bincount(self.cohort_bins + np.int64(self.flat[:,6]),
+                                    minlength = self.replicas * self.num_cohorts * 5)
+        cohort_counts = cohort_counts.reshape((self.replicas, self.num_cohorts, 5))
+
+        for replica in np.flatnonzero(self.active):
+            self.pop_trackers[replica].append_counts(cohort_counts[replica], self.Config.pop_size)
+
+
+    def tstep(self):
+        '''takes a time step in all replicas'''
+
+        #check per replica if a lockdown is in effect
+        lockdown_active = np.zeros((self.replicas,), dtype=bool)
+        if self.Config.lockdown:
+            infected = np.count_nonzero(self.population[:,:,6] == 1, axis=1)
+            peaks = np.array([tracker.peak_infectious for tracker in self.pop_trackers])
+            threshold = self.Config.pop_size * self.Config.lockdown_percentage
+            lockdown_active = (infected >= threshold) | (peaks >= threshold)
+
+        self.update_motion(lockdown_active)
+        self.infect()
+        recover_or_die(self.flat, self.frame, self.Config)
+        self.update_counts()
+
+        #report stuff to console
+        infectious = np.count_nonzero(np.isin(self.population[:,:,6], [1, 4]), axis=1)
+        sys.stdout.write('\r')
+        sys.stdout.write('%i: replicas with infections: %i of %i, mean infected: %.1f'
+                         %(self.frame, np.count_nonzero(infectious), self.replicas, infectious.mean()))
+
+        self.callback()
+
+        #update frame
+        self.frame += 1
+
+        #replicas without infectious people left have ended, as in Simulation.run
+        if self.Config.endif_no_infections and self.frame >= 500:
+            self.active &= infectious > 0
+
+
+    def callback(self):
+        '''infects patient zero in every replica at frame 50, see Simulation.callback'''
+
+        if self.frame == 50:
+            patients = np.arange(self.replicas) * self.Config.pop_size
+            self.flat[patients,6] = 1
+            self.flat[patients,8] = 50
+            self.flat[patients,10] = 1
+
+
+    def run(self):
+        '''run all replicas until the steps run out or no replica has infections left'''
+
+        i = 0
+
+        while i < self.Config.simulation_steps and self.active.any():
+            try:
+                self.tstep()
+            except KeyboardInterrupt:
+                print('\nCTRL-C caught, exiting')
+                sys.exit(1)
+
+            i += 1
+
+        print('\n-----stopping-----\n')
+        print('total timesteps taken: %i' %self.frame)
+        print('mean dead per replica: %.1f' %np.mean([tracker.fatalities[-1] for tracker in self.pop_trackers]))
+        print('mean unaffected per replica: %.1f' %np.mean([tracker.susceptible[-1] for tracker in self.pop_trackers]))
@@ -4,8 +4,13 @@ new infections, recoveries, and deaths
 '''
 # let's make one more productive change here, shall we?
 
+from functools import lru_cache
+import heapq
+
 import numpy as np
-from path_planning import go_to_location
+from numba_kernels import get_backend, find_nearby_numba, resolve_kernel
+from path_planning import go_to_location_batch
+from population import Destination_registry
 
 
 def find_nearby(population, infection_zone, traveling_infects=False,
@@ -60,12 +65,475 @@ def find_nearby(population, infection_zone, traveling_infects=False,
         raise ValueError('type to find %s not understood! Must be either \'healthy\' or \'ill\'')
 
 
+def find_nearby_grid(population, infection_range, traveling_infects=False,
+                     pop_index=None, exclude=None):
+    '''finds healthy IDs with infectious people nearby, using a spatial hash
+
+    Bins all agents into square grid cells with sides of infection_range, once.
+    Any infectious agent within the infection zone of a healthy agent must then
+    be in one of the 3x3 cells surrounding that agent, so only those cells are
+    tested in stead of the whole population.
+
+    Keyword arguments
+    -----------------
+    population : ndarray
+        the array containing all the population information
+
+    infection_range : float
+        the radius around each infected person where transmission of virus can take place,
+        also used as the size of the grid cells
+
+    traveling_infects : bool
+        whether infected people heading to a destination can still infect others on the way there.
+        If False, only infected without an active destination (column 11 == 0) are infectious
+
+    pop_index : Population_index
+        if given, used to look up the healthy and infected in stead of scanning the population
+
+    exclude : ndarray
+        optional boolean mask over the population of agents that neither infect
+        nor get infected here, such as those handled by find_venue_exposed
+
+    Returns
+    -------
+    indices : ndarray
+        IDs of healthy agents that have at least one infectious agent within the infection zone
+
+    infected_counts : ndarray
+        the number of infectious agents within the infection zone of each returned healthy agent
+    '''
+
+    if pop_index is not None:
+        sources = pop_index.get(1)
+        if not traveling_infects:
+            sources = sources[population[sources,11] == 0]
+        targets = pop_index.get(0)
+    else:
+        infectious = population[:,6] == 1
+        if not traveling_infects:
+            infectious = infectious & (population[:,11] == 0)
+
+        sources = np.flatnonzero(infectious)
+        targets = np.flatnonzero(population[:,6] == 0)
+
+    if exclude is not None:
+        sources = sources[~exclude[sources]]
+        targets = targets[~exclude[targets]]
+
+    if len(sources) == 0 or len(targets) == 0:
+        return np.zeros((0,), dtype=np.int32), np.zeros((0,), dtype=np.int64)
+
+    infected_counts = count_nearby_grid(population[sources][:,1:3], population[targets][:,1:3],
+                                        infection_range)
+    exposed = infected_counts > 0
+
+    return np.int32(targets[exposed]), infected_counts[exposed]
+
+
+def count_nearby_grid(source_xy, target_xy, infection_range):
+    '''counts the infectious within the infection zone of every healthy person
+
+    The spatial hash search of find_nearby_grid, on coordinates only.
+
+    Keyword arguments
+    -----------------
+    source_xy, target_xy : ndarray
+        coordinates of the infectious and the healthy, of shape (n, 2)
+
+    infection_range : float
+        the radius around each infected person where transmission of virus can take place
+
+    Returns
+    -------
+    infected_counts : ndarray
+        the number of infectious people near every target
+    '''
+
+    if len(source_xy) == 0 or len(target_xy) == 0:
+        return np.zeros((len(target_xy),), dtype=np.int64)
+
+    #bin into cells, padded by one cell on every side so neighbour keys never wrap
+    origin = np.minimum(source_xy.min(axis=0), target_xy.min(axis=0))
+    source_cells = np.int64((source_xy - origin) // infection_range) + 1
+    target_cells = np.int64((target_xy - origin) // infection_range) + 1
+    rowlen = max(source_cells[:,1].max(), target_cells[:,1].max()) + 2
+
+    source_keys = source_cells[:,0] * rowlen + source_cells[:,1]
+    target_keys = target_cells[:,0] * rowlen + target_cells[:,1]
+
+    #sort infectious agents by cell so each cell is a contiguous slice
+    order = np.argsort(source_keys, kind='stable')
+    source_keys = source_keys[order]
+    source_xy = source_xy[order]
+
+    infected_counts = np.zeros((len(target_xy),), dtype=np.int64)
+
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            neighbour_keys = target_keys + (dx * rowlen) + dy
+            lower = np.searchsorted(source_keys, neighbour_keys, side='left')
+            upper = np.searchsorted(source_keys, neighbour_keys, side='right')
+            cell_counts = upper - lower
+
+            total = cell_counts.sum()
+            if total == 0:
+                continue
+
+            #expand to (healthy, infectious) candidate pairs
+            pair_targets = np.repeat(np.arange(len(target_xy)), cell_counts)
+            pair_sources = np.arange(total) - np.repeat(np.cumsum(cell_counts) - cell_counts,
+                                                        cell_counts)
+            pair_sources += np.repeat(lower, cell_counts)
+
+            #same (open) infection zone test as find_nearby
+            within = ((np.abs(source_xy[pair_sources,0] - target_xy[pair_targets,0]) < infection_range) &
+                      (np.abs(source_xy[pair_sources,1] - target_xy[pair_targets,1]) < infection_range))
+
+            infected_counts += np.bincount(pair_targets[within], minlength=len(target_xy))
+
+    return infected_counts
+
+
+def find_nearby_meanfield(population, infection_range, traveling_infects=False,
+                          pop_index=None, exclude=None):
+    '''approximates the number of infectious people near every healthy person
+
+    Rasterises the infectious onto a grid with cells of 2 * infection_range,
+    the size of the infection zone, with a single bincount. Every healthy
+    person is then exposed to the number of infectious in their own cell,
+    in stead of to those within their infection zone. On average both counts
+    are the same, so the epidemic develops alike, but who infects whom is
+    approximate. Costs O(N) regardless of crowding.
+    See simulation.compare_infection_engines for a comparison to exact modes.
+
+    Keyword arguments
+    -----------------
+    population : ndarray
+        the array containing all the population information
+
+    infection_range : float
+        the radius around each infected person where transmission of virus can take place
+
+    traveling_infects : bool
+        If False, only infected without an active destination (column 11 == 0) are infectious
+
+    pop_index : Population_index
+        if given, used to look up the healthy and infected in stead of scanning the population
+
+    exclude : ndarray
+        optional boolean mask over the population of agents that neither infect
+        nor get infected here
+
+    Returns
+    -------
+    indices : ndarray
+        IDs of healthy agents in a cell with at least one infectious agent
+
+    infected_counts : ndarray
+        the number of infectious agents in the cell of each returned healthy agent
+    '''
+
+    if pop_index is not None:
+        sources = pop_index.get(1)
+        targets = pop_index.get(0)
+    else:
+        sources = np.flatnonzero(population[:,6] == 1)
+        targets = np.flatnonzero(population[:,6] == 0)
+
+    if not traveling_infects:
+        sources = sources[population[sources,11] == 0]
+    if exclude is not None:
+        sources = sources[~exclude[sources]]
+        targets = targets[~exclude[targets]]
+
+    if len(sources) == 0 or len(targets) == 0:
+        return np.zeros((0,), dtype=np.int32), np.zeros((0,), dtype=np.int64)
+
+    source_xy = population[sources][:,1:3]
+    target_xy = population[targets][:,1:3]
+
+    #rasterise the infectious, cells are numbered row by row
+    cell_size = 2 * infection_range
+    origin = np.minimum(source_xy.min(axis=0), target_xy.min(axis=0))
+    source_cells = np.int64((source_xy - origin) // cell_size)
+    target_cells = np.int64((target_xy - origin) // cell_size)
+    rowlen = max(source_cells[:,1].max(), target_cells[:,1].max()) + 1
+
+    cell_counts = np.bincount(source_cells[:,0] * rowlen + source_cells[:,1])
+
+    #look up the count of each healthy agent's cell, cells past the last infectious are empty
+    target_keys = target_cells[:,0] * rowlen + target_cells[:,1]
+    infected_counts = np.zeros((len(targets),), dtype=np.int64)
+    within = target_keys < len(cell_counts)
+    infected_counts[within] = cell_counts[target_keys[within]]
+
+    exposed = infected_counts > 0
+
+    return np.int32(targets[exposed]), infected_counts[exposed]
+
+
+def find_network_exposed(population, network, traveling_infects=False,
+                         pop_index=None, exclude=None):
+    '''finds healthy IDs with infectious contacts in the contact network
+
+    Gathers the contacts of all infectious people in one go and counts, for
+    every healthy contact, how many infectious people they are connected to.
+    The cost scales with the number of edges of the infectious, not with the
+    population size.
+
+    Keyword arguments
+    -----------------
+    population : ndarray
+        the array containing all the population information
+
+    network : Contact_network
+        the contact network of the population, see network.initialize_contact_network
+
+    traveling_infects : bool
+        If False, only infected without an active destination (column 11 == 0) are infectious
+
+    pop_index : Population_index
+        if given, used to look up the infected in stead of scanning the population
+
+    exclude : ndarray
+        optional boolean mask over the population of agents that neither infect
+        nor get infected here
+
+    Returns
+    -------
+    indices : ndarray
+        IDs of healthy agents with at least one infectious contact
+
+    infected_counts : ndarray
+        the number of infectious contacts of each returned healthy agent
+    '''
+
+    if pop_index is not None:
+        sources = pop_index.get(1)
+    else:
+        sources = np.flatnonzero(population[:,6] == 1)
+
+    if not traveling_infects:
+        sources = sources[population[sources,11] == 0]
+    if exclude is not None:
+        sources = sources[~exclude[sources]]
+
+    contacts = network.gather(sources)
+    contacts = contacts[population[contacts,6] == 0]
+    if exclude is not None:
+        contacts = contacts[~exclude[contacts]]
+
+    indices, infected_counts = np.unique(contacts, return_counts=True)
+
+    return np.int32(indices), np.int64(infected_counts)
+
+
+def find_venue_exposed(population, pop_index=None):
+    '''finds healthy IDs sharing a venue with infectious people
+
+    People who arrived at their destination (column 11 != 0, column 12 == 1)
+    are treated as sharing one space with everybody else at that destination.
+    This needs every destination number to stand for one place, as with a
+    Destination_registry: the destination matrix can give people different
+    locations under the same number, which are not one venue.
+    The infectious are counted per destination number with a single bincount,
+    and every healthy person at a venue gets the count of their venue, so the
+    cost is linear in the number of people at venues, however crowded.
+
+    Keyword arguments
+    -----------------
+    population : ndarray
+        the array containing all the population information
+
+    pop_index : Population_index
+        if given, only people with an active destination are looked at
+
+    Returns
+    -------
+    indices : ndarray
+        IDs of healthy people at a venue with at least one infectious person
+
+    infected_counts : ndarray
+        the number of infectious people at the venue of each returned healthy person
+    '''
+
+    if pop_index is not None:
+        candidates = pop_index.destination.indices
+    else:
+        candidates = np.flatnonzero(population[:,11] != 0)
+
+    confined = candidates[population[candidates,12] == 1]
+    venues = np.int64(population[confined,11])
+    states = population[confined,6]
+
+    sources = venues[states == 1]
+    if len(sources) == 0:
+        return np.zeros((0,), dtype=np.int32), np.zeros((0,), dtype=np.int64)
+
+    venue_counts = np.bincount(sources, minlength = venues.max() + 1)
+
+    healthy = states == 0
+    infected_counts = venue_counts[venues[healthy]]
+    exposed = infected_counts > 0
+
+    return np.int32(confined[healthy][exposed]), infected_counts[exposed]
+
+
+def find_household_exposed(population, households):
+    '''finds healthy IDs with infectious people in their household
+
+    Flags the infectious at home (not in treatment and without an active
+    destination), sums the flags per household with a segment reduction and
+    hands every healthy member the count of their household, in time linear
+    in the population size.
+
+    Keyword arguments
+    -----------------
+    population : ndarray
+        the array containing all the population information
+
+    households : Households
+        the household membership of the population, see initialize_households
+
+    Returns
+    -------
+    indices : ndarray
+        IDs of healthy people with at least one infectious household member
+
+    infected_counts : ndarray
+        the number of infectious members in the household of each returned person
+    '''
+
+    infectious = np.int64((population[:,6] == 1) & (population[:,10] == 0) &
+                          (population[:,11] == 0))
+    member_counts = households.member_totals(infectious)
+
+    exposed = (member_counts > 0) & (population[households.members,6] == 0)
+
+    return households.members[exposed], member_counts[exposed]
+
+
+def combine_exposures(indices, infection_odds):
+    '''merges the exposures of several transmission channels
+
+    Someone exposed through more than one channel escapes infection only if
+    they escape every one of them, so the odds are combined as
+    1 - product(1 - odds) per person.
+
+    Keyword arguments
+    -----------------
+    indices : list of ndarray
+        IDs exposed through each channel
+
+    infection_odds : list of ndarray
+        the odds of infection through each channel, matching indices
+
+    Returns
+    -------
+    indices : ndarray
+        unique IDs of everybody exposed, sorted
+
+    infection_odds : ndarray
+        the combined odds of infection of every returned person
+    '''
+
+    indices = np.concatenate(indices)
+    escape = 1 - np.clip(np.concatenate(infection_odds), 0, 1)
+
+    order = np.argsort(indices, kind='stable')
+    indices = indices[order]
+    unique_indices, starts = np.unique(indices, return_index=True)
+
+    if len(unique_indices) == 0:
+        return np.int32(unique_indices), escape
+
+    escape = np.multiply.reduceat(escape[order], starts)
+
+    return np.int32(unique_indices), 1 - escape
+
+
+def infect_exposed(population, indices, infection_odds, Config, frame,
+                   send_to_location=False, location_bounds=[], destinations=[],
+                   location_no=1, location_odds=1.0, scheduler=None,
+                   pop_index=None):
+    '''infects exposed healthy people and admits them to treatment
+
+    Rolls the dice for all exposed healthy people at once, then admits the
+    new patients to treatment in order, for as long as the healthcare system
+    has capacity left.
+
+    Keyword arguments
+    -----------------
+    population : ndarray
+        array containing all data on the population
+
+    indices : ndarray
+        IDs of the exposed healthy people
+
+    infection_odds : ndarray
+        the odds that each of the exposed people becomes infected this timestep
+
+    Config : Configuration
+        the configuration class, provides healthcare_capacity
+
+    frame : int
+        the current timestep of the simulation
+
+    send_to_location, location_bounds, destinations, location_no, location_odds,
+    scheduler, pop_index
+        see infect()
+
+    Returns
+    -------
+    new_infections : ndarray
+        IDs of the people that got infected
+    '''
+
+    indices = np.asarray(indices, dtype=np.int32)
+
+    #roll all dice in one go
+    infected = np.random.random(size=indices.shape) < infection_odds
+    new_infections = indices[infected]
+
+    population[new_infections,6] = 1
+    population[new_infections,8] = frame
+
+    if scheduler is not None:
+        scheduler.schedule(population, new_infections)
+
+    #patients are admitted for as long as the number already in
+    #treatment does not exceed healthcare_capacity
+    if pop_index is not None:
+        pop_index.set_state(new_infections, 1)
+        in_treatment = len(pop_index.treatment)
+    else:
+        in_treatment = np.count_nonzero(population[:,10] == 1)
+
+    free_beds = Config.healthcare_capacity - in_treatment + 1
+    admitted = indices[infected & (np.cumsum(infected) <= free_beds)]
+    population[admitted,10] = 1
+
+    if pop_index is not None:
+        pop_index.set_treatment(admitted)
+
+    if send_to_location and len(admitted) > 0:
+        #send to location if die roll is positive
+        sent = admitted[np.random.uniform(size=admitted.shape) <= location_odds]
+        population, destinations = go_to_location_batch(population, destinations, sent,
+                                                         location_bounds, dest_no=location_no)
+
+        if pop_index is not None:
+            pop_index.set_destination(sent)
+
+    return new_infections
+
 
 
 
 def infect(population, Config, frame, send_to_location=False,
            location_bounds=[], destinations=[], location_no=1,
-           location_odds=1.0):
+           location_odds=1.0, scheduler=None, pop_index=None, households=None,
+           network=None, tile_pool=None):
     '''finds new infections.
 
     Function that finds new infections in an area around infected persens
@@ -115,89 +583,159 @@ def infect(population, Config, frame, send_to_location=False,
 
     traveling_infects : bool
         whether infected people heading to a destination can still infect others on the way there
+
+    scheduler : Recovery_scheduler
+        if given, new infections are scheduled for recovery_or_die() here
+
+    pop_index : Population_index
+        if given, used to slice the healthy and infected directly and kept up
+        to date with the new infections
+
+    households : Households
+        if given and Config.household_transmission is set, the infectious also
+        infect healthy members of their household, see find_household_exposed
+
+    network : Contact_network
+        the contact network, required when Config.infection_engine is 'network'
+
+    tile_pool : Tile_pool
+        if given, the 'grid' search is split in tiles run on its threads, see parallel.py
+
+    With Config.venue_transmission, people who arrived at a destination are
+    left out of the search by distance and infected per venue in stead, see
+    find_venue_exposed. Venues need destinations to be a Destination_registry.
     '''
 
-    #mark those already infected first
-    infected_previous_step = population[population[:,6] == 1]
-    healthy_previous_step = population[population[:,6] == 0]
+    if Config.venue_transmission and not isinstance(destinations, Destination_registry):
+        raise ValueError('venue transmission needs a Destination_registry (Config.destination_storage \'registry\'), \
+the destination matrix can hold different locations under one destination number')
 
-    new_infections = []
+    #mark those already infected first
+    if pop_index is not None:
+        infected_previous_step = population[np.sort(pop_index.get(1))]
+    else:
+        infected_previous_step = population[population[:,6] == 1]
+
+    #people at a venue only infect, and get infected, within their venue
+    confined = None
+    spreading = infected_previous_step
+    if Config.venue_transmission:
+        confined = (population[:,11] != 0) & (population[:,12] == 1)
+        spreading = infected_previous_step[~confined[np.int64(infected_previous_step[:,0])]]
+
+    if Config.infection_engine.lower() == 'grid':
+        #find all healthy people with infectious people nearby in one pass
+        backend = get_backend(Config)
+        if tile_pool is not None:
+            indices, infected_counts = tile_pool.find_nearby(population, Config.infection_range,
+                                                             traveling_infects = Config.traveling_infects,
+                                                             pop_index = pop_index,
+                                                             exclude = confined,
+                                                             backend = backend)
+        else:
+            if backend == 'numba':
+                find_nearby_fn = find_nearby_numba
+            else:
+                find_nearby_fn = find_nearby_grid
+
+            indices, infected_counts = find_nearby_fn(population, Config.infection_range,
+                                                      traveling_infects = Config.traveling_infects,
+                                                      pop_index = pop_index,
+                                                      exclude = confined)
+
+    elif Config.infection_engine.lower() == 'meanfield':
+        #approximate: everyone is exposed to all infectious in their cell
+        indices, infected_counts = find_nearby_meanfield(population, Config.infection_range,
+                                                         traveling_infects = Config.traveling_infects,
+                                                         pop_index = pop_index,
+                                                         exclude = confined)
+
+    elif Config.infection_engine.lower() == 'network':
+        #infect along the edges of the contact network, positions play no part
+        indices, infected_counts = find_network_exposed(population, network,
+                                                        traveling_infects = Config.traveling_infects,
+                                                        pop_index = pop_index,
+                                                        exclude = confined)
 
     #if less than half are infected, slice based on infected (to speed up computation)
-    if len(infected_previous_step) < (Config.pop_size // 2):
-        for patient in infected_previous_step:
+    elif len(infected_previous_step) < (Config.pop_size // 2):
+        infected_counts = np.zeros((len(population),), dtype=np.int64)
+
+        for patient in spreading:
             #define infection zone for patient
             infection_zone = [patient[1] - Config.infection_range, patient[2] - Config.infection_range,
                                 patient[1] + Config.infection_range, patient[2] + Config.infection_range]
 
             #find healthy people surrounding infected patient
             if Config.traveling_infects or patient[11] == 0:
-                indices = find_nearby(population, infection_zone, kind = 'healthy')
-            else:
-                indices = []
-
-            for idx in indices:
-                #roll die to see if healthy person will be infected
-                if np.random.random() < Config.infection_chance:
-                    population[idx][6] = 1
-                    population[idx][8] = frame
-                    if len(population[population[:,10] == 1]) <= Config.healthcare_capacity:
-                        population[idx][10] = 1
-                        if send_to_location:
-                            #send to location if die roll is positive
-                            if np.random.uniform() <= location_odds:
-                                population[idx],\
-                                destinations[idx] = go_to_location(population[idx],
-                                                                   destinations[idx],
-                                                                   location_bounds,
-                                                                   dest_no=location_no)
-                        else:
-                            pass
-                    new_infections.append(idx)
+                infected_counts[find_nearby(population, infection_zone, kind = 'healthy')] += 1
+
+        indices = np.int32(np.flatnonzero(infected_counts))
+        infected_counts = infected_counts[indices]
 
     else:
         #if more than half are infected slice based in healthy people (to speed up computation)
+        if pop_index is not None:
+            healthy_previous_step = population[np.sort(pop_index.get(0))]
+        else:
+            healthy_previous_step = population[population[:,6] == 0]
 
+        infected_counts = np.zeros((len(healthy_previous_step),), dtype=np.int64)
 
-
-        for person in healthy_previous_step:
+        for i, person in enumerate(healthy_previous_step):
             #define infecftion range around healthy person
             infection_zone = [person[1] - Config.infection_range, person[2] - Config.infection_range,
                                 person[1] + Config.infection_range, person[2] + Config.infection_range]
 
-            if person[6] == 0: #if person is not already infected, find if infected are nearby
-                #find infected nearby healthy person
-                if Config.traveling_infects:
-                    poplen = find_nearby(population, infection_zone,
-                                         traveling_infects = True,
-                                         kind = 'infected')
-                else:
-                    poplen = find_nearby(population, infection_zone,
-                                         traveling_infects = True,
-                                         kind = 'infected',
-                                         infected_previous_step = infected_previous_step)
-
-                if poplen > 0:
-                    if np.random.random() < (Config.infection_chance * poplen):
-                        #roll die to see if healthy person will be infected
-                        population[np.int32(person[0])][6] = 1
-                        population[np.int32(person[0])][8] = frame
-                        if len(population[population[:,10] == 1]) <= Config.healthcare_capacity:
-                            population[np.int32(person[0])][10] = 1
-                            if send_to_location:
-                                #send to location and add to treatment if die roll is positive
-                                if np.random.uniform() < location_odds:
-                                    population[np.int32(person[0])],\
-                                    destinations[np.int32(person[0])] = go_to_location(population[np.int32(person[0])],
-                                                                                        destinations[np.int32(person[0])],
-                                                                                        location_bounds,
-                                                                                        dest_no=location_no)
-
-
-                        new_infections.append(np.int32(person[0]))
+            #find infected nearby healthy person
+            infected_counts[i] = find_nearby(population, infection_zone,
+                                             traveling_infects = Config.traveling_infects,
+                                             kind = 'infected',
+                                             infected_previous_step = spreading)
+
+        indices = np.int32(healthy_previous_step[:,0][infected_counts > 0])
+        infected_counts = infected_counts[infected_counts > 0]
+
+    if confined is not None and Config.infection_engine.lower() not in ('grid', 'meanfield', 'network'):
+        #drop the confined found by distance, they are exposed through their venue
+        keep = ~confined[indices]
+        indices = indices[keep]
+        infected_counts = infected_counts[keep]
+
+    #one die roll per infected patient nearby if less than half are infected,
+    #otherwise odds scale with the number of infected nearby
+    if len(infected_previous_step) < (Config.pop_size // 2):
+        infection_odds = 1 - ((1 - Config.infection_chance) ** infected_counts)
+    else:
+        infection_odds = Config.infection_chance * infected_counts
+
+    channel_indices = [indices]
+    channel_odds = [infection_odds]
+
+    if Config.venue_transmission:
+        venue_indices, venue_counts = find_venue_exposed(population, pop_index)
+        channel_indices.append(venue_indices)
+        channel_odds.append(1 - ((1 - Config.venue_infection_chance) ** venue_counts))
+
+    if Config.household_transmission and households is not None:
+        household_indices, household_counts = find_household_exposed(population, households)
+        channel_indices.append(household_indices)
+        channel_odds.append(1 - ((1 - Config.household_infection_chance) ** household_counts))
+
+    if len(channel_indices) > 1:
+        indices, infection_odds = combine_exposures(channel_indices, channel_odds)
+
+    new_infections = infect_exposed(population, indices, infection_odds, Config, frame,
+                                    send_to_location = send_to_location,
+                                    location_bounds = location_bounds,
+                                    destinations = destinations,
+                                    location_no = location_no,
+                                    location_odds = location_odds,
+                                    scheduler = scheduler,
+                                    pop_index = pop_index)
 
     if len(new_infections) > 0 and Config.verbose:
-        print('\nat timestep %i these people got sick: %s' %(frame, new_infections))
+        print('\nat timestep %i these people got sick: %s' %(frame, new_infections.tolist()))
 
     if len(destinations) == 0:
         return population
@@ -205,7 +743,7 @@ def infect(population, Config, frame, send_to_location=False,
         return population, destinations
 
 
-def recover_or_die(population, frame, Config):
+def recover_or_die(population, frame, Config, scheduler=None, pop_index=None):
     '''see whether to recover or die
 
 
@@ -250,65 +788,209 @@ def recover_or_die(population, frame, Config):
 
     verbose : bool
         whether to report to terminal the recoveries and deaths for each simulation step
+
+    scheduler : Recovery_scheduler
+        if given, only the people the scheduler has due at this frame are
+        resolved, in stead of testing everyone who is infected. Infected
+        people the scheduler does not know about are scheduled first
+
+    pop_index : Population_index
+        if given, used to find the infected and kept up to date with the
+        recoveries and deaths. Only those it recorded as newly infected
+        are checked for being scheduled
     '''
 
-    #find infected people
-    infected_people = population[population[:,6] == 1]
+    new_infected = pop_index.take_new_infected() if pop_index is not None else None
+
+    if scheduler is not None:
+        #pick up anyone infected outside of infect(), such as in a callback
+        scheduler.schedule_missing(population, new_infected)
+        indices = scheduler.pop_due(population, frame)
+    else:
+        #find infected people
+        if pop_index is not None:
+            infected_people = population[np.sort(pop_index.get(1))]
+        else:
+            infected_people = population[population[:,6] == 1]
 
-    #define vector of how long everyone has been sick
-    illness_duration_vector = frame - infected_people[:,8]
+        #define vector of how long everyone has been sick
+        illness_duration_vector = frame - infected_people[:,8]
 
-    recovery_odds_vector = (illness_duration_vector - Config.recovery_duration[0]) / np.ptp(Config.recovery_duration)
-    recovery_odds_vector = np.clip(recovery_odds_vector, a_min = 0, a_max = None)
+        recovery_odds_vector = (illness_duration_vector - Config.recovery_duration[0]) / np.ptp(Config.recovery_duration)
+        recovery_odds_vector = np.clip(recovery_odds_vector, a_min = 0, a_max = None)
 
-    #update states of sick people
-    indices = infected_people[:,0][recovery_odds_vector >= infected_people[:,9]]
+        #update states of sick people
+        indices = np.int32(infected_people[:,0][recovery_odds_vector >= infected_people[:,9]])
+
+    #check if we want risk to be age dependent
+    if Config.age_dependent_risk:
+        mortality_table = get_mortality_table(Config)
+        ages = np.clip(np.int32(population[indices,7]), 0, len(mortality_table) - 1)
+        updated_mortality_chance = mortality_table[ages]
+    else:
+        updated_mortality_chance = np.full(indices.shape, Config.mortality_chance)
 
-    recovered = []
-    fatalities = []
+    if Config.treatment_dependent_risk:
+        #increase risk by no_treatment_factor if not in treatment, change by treatment_factor if in treatment
+        updated_mortality_chance = updated_mortality_chance * np.where(population[indices,10] == 1,
+                                                                       Config.treatment_factor,
+                                                                       Config.no_treatment_factor)
 
     #decide whether to die or recover
-    for idx in indices:
-        #check if we want risk to be age dependent
-        #if age_dependent_risk:
-        if Config.age_dependent_risk:
-            updated_mortality_chance = compute_mortality(infected_people[infected_people[:,0] == idx][:,7][0],
-                                                            Config.mortality_chance,
-                                                            Config.risk_age, Config.critical_age,
-                                                            Config.critical_mortality_chance,
-                                                            Config.risk_increase)
-        else:
-            updated_mortality_chance = Config.mortality_chance
-
-        if infected_people[infected_people[:,0] == int(idx)][:,10] == 0 and Config.treatment_dependent_risk:
-            #if person is not in treatment, increase risk by no_treatment_factor
-            updated_mortality_chance = updated_mortality_chance * Config.no_treatment_factor
-        elif infected_people[infected_people[:,0] == int(idx)][:,10] == 1 and Config.treatment_dependent_risk:
-            #if person is in treatment, decrease risk by
-            updated_mortality_chance = updated_mortality_chance * Config.treatment_factor
-
-        if np.random.random() <= updated_mortality_chance:
-            #die
-            infected_people[:,6][infected_people[:,0] == idx] = 3
-            infected_people[:,10][infected_people[:,0] == idx] = 0
-            fatalities.append(np.int32(infected_people[infected_people[:,0] == idx][:,0][0]))
-        else:
-            #recover (become immune)
-            infected_people[:,6][infected_people[:,0] == idx] = 2
-            infected_people[:,10][infected_people[:,0] == idx] = 0
-            recovered.append(np.int32(infected_people[infected_people[:,0] == idx][:,0][0]))
+    if get_backend(Config) == 'numba':
+        died = resolve_kernel(population, np.int64(indices), np.float64(updated_mortality_chance))
+        fatalities = indices[died]
+        recovered = indices[~died]
+    else:
+        died = np.random.random(size=indices.shape) <= updated_mortality_chance
+        fatalities = indices[died]
+        recovered = indices[~died]
+
+        #die
+        population[fatalities,6] = 3
+        #recover (become immune)
+        population[recovered,6] = 2
+        population[indices,10] = 0
+
+    if pop_index is not None:
+        pop_index.set_state(fatalities, 3)
+        pop_index.set_state(recovered, 2)
+        pop_index.set_treatment(indices, False)
 
     if len(fatalities) > 0 and Config.verbose:
-        print('\nat timestep %i these people died: %s' %(frame, fatalities))
+        print('\nat timestep %i these people died: %s' %(frame, fatalities.tolist()))
     if len(recovered) > 0 and Config.verbose:
-        print('\nat timestep %i these people recovered: %s' %(frame, recovered))
-
-    #put array back into population
-    population[population[:,6] == 1] = infected_people
+        print('\nat timestep %i these people recovered: %s' %(frame, recovered.tolist()))
 
     return population
 
 
+class Recovery_scheduler():
+    '''schedules recoveries and deaths by the frame they become due
+
+    Someone who is infected recovers or dies from the first frame where
+    (frame - infected_since - recovery_duration[0]) / ptp(recovery_duration)
+    reaches their recovery vector (column 9). That frame is known at the
+    moment of infection, so people are put in a bucket for that frame and
+    each timestep only the bucket that is due is looked at.
+
+    infect() schedules everyone it infects when it is given the scheduler.
+    People infected in any other way (for example in Simulation.callback, or
+    by editing the population matrix) are scheduled by schedule_missing(),
+    which recover_or_die() calls every timestep, so they recover or die as
+    well. With a Population_index it only looks at those the index recorded
+    as newly infected, without one it looks at everyone who is infected.
+    '''
+    def __init__(self, Config):
+        self.Config = Config
+        #frame -> list of ID arrays due at that frame
+        self.buckets = {}
+        #heap of frames that have a bucket
+        self.frames = []
+        #marks everyone with a pending entry in one of the buckets
+        self.scheduled = np.zeros((Config.pop_size,), dtype=bool)
+
+    def schedule(self, population, indices):
+        '''schedules infected people for recovery or death
+
+        Keyword arguments
+        -----------------
+        population : ndarray
+            the array containing all the population information
+
+        indices : ndarray or list
+            IDs of the people that have just been infected
+        '''
+        indices = np.asarray(indices, dtype=np.int32)
+        if len(indices) == 0:
+            return
+
+        infected_since = population[indices,8]
+        recovery_vector = population[indices,9]
+
+        #a non-positive recovery vector is due straight away
+        due_frames = np.where(recovery_vector <= 0, infected_since,
+                              np.ceil(infected_since + self.Config.recovery_duration[0] +
+                                      (recovery_vector * np.ptp(self.Config.recovery_duration))))
+        due_frames = np.int64(due_frames)
+
+        self.scheduled[indices] = True
+
+        #group by due frame
+        order = np.argsort(due_frames, kind='stable')
+        due_frames = due_frames[order]
+        starts = np.flatnonzero(np.diff(due_frames, prepend=due_frames[0] - 1))
+
+        for due_frame, bucket in zip(due_frames[starts], np.split(indices[order], starts[1:])):
+            self.schedule_at(int(due_frame), bucket)
+
+    def schedule_at(self, frame, indices):
+        '''adds IDs to the bucket of the given frame'''
+        if len(indices) == 0:
+            return
+
+        if frame not in self.buckets:
+            self.buckets[frame] = []
+            heapq.heappush(self.frames, frame)
+        self.buckets[frame].append(indices)
+
+    def schedule_missing(self, population, infected=None):
+        '''schedules the infected that have not been scheduled yet
+
+        Keyword arguments
+        -----------------
+        population : ndarray
+            the array containing all the population information
+
+        infected : ndarray
+            IDs of the people to schedule if they are not scheduled yet, for
+            example those newly infected. Everyone who is infected if not given
+        '''
+        if infected is None:
+            infected = np.flatnonzero(population[:,6] == 1)
+        else:
+            infected = infected[population[infected,6] == 1]
+
+        self.schedule(population, infected[~self.scheduled[infected]])
+
+    def pop_due(self, population, frame):
+        '''returns the IDs of everyone due to recover or die at the given frame
+
+        Buckets of earlier frames that have not been collected are included.
+        People that are no longer infected are dropped, and anyone not yet
+        due because of rounding in their due frame is moved to the next frame.
+
+        Keyword arguments
+        -----------------
+        population : ndarray
+            the array containing all the population information
+
+        frame : int
+            the current timestep of the simulation
+        '''
+        due = []
+        while len(self.frames) > 0 and self.frames[0] <= frame:
+            due.extend(self.buckets.pop(heapq.heappop(self.frames)))
+
+        if len(due) == 0:
+            return np.zeros((0,), dtype=np.int32)
+
+        indices = np.unique(np.concatenate(due))
+        self.scheduled[indices] = False
+        indices = indices[population[indices,6] == 1]
+
+        #same test as recover_or_die() uses without a scheduler
+        recovery_odds_vector = ((frame - population[indices,8] - self.Config.recovery_duration[0]) /
+                                np.ptp(self.Config.recovery_duration))
+        recovery_odds_vector = np.clip(recovery_odds_vector, a_min = 0, a_max = None)
+        ready = recovery_odds_vector >= population[indices,9]
+
+        self.schedule_at(frame + 1, indices[~ready])
+        self.scheduled[indices[~ready]] = True
+
+        return indices[ready]
+
+
 def compute_mortality(age, mortality_chance, risk_age=50,
                       critical_age=80, critical_mortality_chance=0.5,
                       risk_increase='linear'):
@@ -323,8 +1005,8 @@ def compute_mortality(age, mortality_chance, risk_age=50,
 
     Keyword arguments
     -----------------
-    age : int
-        the age of the person
+    age : int or ndarray
+        the age of the person, or an array of ages
 
     mortality_chance : float
         the base mortality chance
@@ -345,30 +1027,72 @@ def compute_mortality(age, mortality_chance, risk_age=50,
         and the critical age increases linearly or exponentially
     '''
 
-    if risk_age < age < critical_age: # if age in range
-        if risk_increase == 'linear':
-            #find linear risk
-            step_increase = (critical_mortality_chance) / ((critical_age - risk_age) + 1)
-            risk = critical_mortality_chance - ((critical_age - age) * step_increase)
-            return risk
-        elif risk_increase == 'quadratic':
-            #define exponential function between risk_age and critical_age
-            pw = 15
-            A = np.exp(np.log(mortality_chance / critical_mortality_chance)/pw)
-            a = ((risk_age - 1) - critical_age * A) / (A - 1)
-            b = mortality_chance / ((risk_age -1) + a ) ** pw
-
-            #define linespace
-            x = np.linspace(0, critical_age, critical_age)
-            #find values
-            risk_values = ((x + a) ** pw) * b
-            return risk_values[np.int32(age- 1)]
-    elif age <= risk_age:
-        #simply return the base mortality chance
-        return mortality_chance
-    elif age >= critical_age:
-        #simply return the maximum mortality chance
-        return critical_mortality_chance
+    age = np.asarray(age)
+
+    #ages up to risk_age get the base mortality chance, ages from critical_age the maximum
+    risk = np.where(age <= risk_age, mortality_chance, critical_mortality_chance)
+    in_range = (risk_age < age) & (age < critical_age) # if age in range
+
+    if risk_increase == 'linear':
+        #find linear risk
+        step_increase = (critical_mortality_chance) / ((critical_age - risk_age) + 1)
+        risk = np.where(in_range, critical_mortality_chance - ((critical_age - age) * step_increase),
+                        risk)
+    elif risk_increase == 'quadratic':
+        #define exponential function between risk_age and critical_age
+        pw = 15
+        A = np.exp(np.log(mortality_chance / critical_mortality_chance)/pw)
+        a = ((risk_age - 1) - critical_age * A) / (A - 1)
+        b = mortality_chance / ((risk_age -1) + a ) ** pw
+
+        #define linespace
+        x = np.linspace(0, critical_age, critical_age)
+        #find values
+        risk_values = ((x + a) ** pw) * b
+        risk = np.where(in_range, risk_values[np.clip(np.int32(age - 1), 0, critical_age - 1)],
+                        risk)
+
+    #return a scalar if a single age was passed
+    return risk[()]
+
+
+def get_mortality_table(Config):
+    '''returns the age-dependent mortality chances for all ages
+
+    Returns the mortality chance for every whole age from 0 up to and
+    including max_age, so that the risk of many people can be looked up by
+    indexing the table with their ages. The table is only recomputed when
+    one of the configuration fields it depends on has changed.
+
+    Keyword arguments
+    -----------------
+    Config : Configuration
+        the configuration class, provides max_age, mortality_chance, risk_age,
+        critical_age, critical_mortality_chance and risk_increase
+    '''
+
+    return build_mortality_table(int(Config.max_age), Config.mortality_chance,
+                                 Config.risk_age, Config.critical_age,
+                                 Config.critical_mortality_chance,
+                                 Config.risk_increase)
+
+
+@lru_cache(maxsize=16)
+def build_mortality_table(max_age, mortality_chance, risk_age, critical_age,
+                          critical_mortality_chance, risk_increase):
+    '''computes the age to mortality chance lookup table
+
+    Cached on its arguments, see get_mortality_table() and compute_mortality()
+    '''
+
+    mortality_table = compute_mortality(np.arange(max_age + 1), mortality_chance,
+                                        risk_age, critical_age,
+                                        critical_mortality_chance, risk_increase)
+    mortality_table = np.float64(np.atleast_1d(mortality_table))
+    #shared between calls, so guard against accidental in-place edits
+    mortality_table.flags.writeable = False
+
+    return mortality_table
 
 
 def healthcare_infection_correction(worker_population, healthcare_risk_factor=0.2):
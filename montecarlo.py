@@ -0,0 +1,523 @@
+'''
+contains the Monte Carlo runner, that runs one scenario from many seeds on
+all cores and summarises the curves of all runs as they come in
+'''
+
+import itertools
+import multiprocessing
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from config import Configuration
+from sweep import RESULT_FIELDS, get_config_values, run_headless, run_point
+
+
+class Running_moments():
+    '''running mean and variance of a stream of arrays (Welford's method)
+
+    Keyword arguments
+    -----------------
+    shape : tuple
+        shape of the arrays to summarise
+    '''
+    def __init__(self, shape=()):
+        self.count = 0
+        self.mean = np.zeros(shape, dtype=np.float64)
+        self.m2 = np.zeros(shape, dtype=np.float64) #sum of squared deviations from the mean
+
+    def add(self, values):
+        '''updates the moments with one array of values'''
+        self.count += 1
+        delta = values - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (values - self.mean)
+
+    @property
+    def variance(self):
+        '''the sample variance, zero until two arrays are added'''
+        if self.count < 2:
+            return np.zeros_like(self.m2)
+        return self.m2 / (self.count - 1)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+
+class P2_quantile():
+    '''streaming estimate of one quantile of every element of a stream of arrays
+
+    Uses the P-square algorithm (Jain and Chlamtac, 1985), that follows the
+    quantile with five markers per element in stead of keeping all values.
+    The markers of all elements are updated together, so memory and work per
+    array added are a small multiple of the array size.
+
+    The markers are unreliable while few values are in, so the first
+    exact_until arrays are kept and the quantile is computed exactly from
+    them. The markers start from these arrays once more come in.
+
+    Keyword arguments
+    -----------------
+    shape : tuple
+        shape of the arrays to summarise
+
+    quantile : float
+        the quantile to estimate, between 0 and 1
+
+    exact_until : int
+        the number of arrays to keep and compute the quantile of exactly, at least 5
+    '''
+    def __init__(self, shape=(), quantile=0.5, exact_until=30):
+        self.shape = tuple(shape)
+        self.quantile = quantile
+        self.exact_until = max(exact_until, 5)
+        self.count = 0
+        #the first arrays, until the markers start
+        self.samples = None
+        #marker heights and positions, the first axis holds the five markers
+        self.heights = None
+        self.positions = None
+        #desired marker positions, and their increase per array added
+        self.increments = np.array([0, quantile / 2, quantile, (1 + quantile) / 2, 1])
+        self.desired = None
+
+    @classmethod
+    def from_samples(cls, samples, quantile=0.5):
+        '''starts the markers from the arrays stacked in samples, at least 5'''
+        sketch = cls(samples.shape[1:], quantile)
+        sketch.start(samples)
+        return sketch
+
+    @property
+    def started(self):
+        return self.heights is not None
+
+    def start(self, samples):
+        '''places the markers at the order statistics of the given arrays'''
+
+        count = len(samples)
+        ordered = np.sort(samples, axis=0)
+
+        #marker ranks as near as possible to where they should be, but all different
+        ranks = np.int64(np.round((count - 1) * self.increments))
+        for i in range(1, 4):
+            ranks[i] = max(ranks[i], ranks[i - 1] + 1)
+        for i in range(3, 0, -1):
+            ranks[i] = min(ranks[i], ranks[i + 1] - 1)
+
+        self.heights = ordered[ranks].astype(np.float64)
+        self.positions = np.broadcast_to((ranks + 1.0).reshape((5,) + (1,) * len(self.shape)),
+                                         self.heights.shape).copy()
+        self.desired = 1 + (count - 1) * self.increments
+        self.count = count
+        self.samples = None
+
+    def add(self, values):
+        '''updates the markers with one array of values'''
+
+        values = np.asarray(values, dtype=np.float64)
+        if not self.started:
+            if self.count < self.exact_until:
+                if self.samples is None:
+                    self.samples = np.zeros((self.exact_until,) + self.shape, dtype=np.float64)
+                self.samples[self.count] = values
+                self.count += 1
+                return
+            self.start(self.samples)
+
+        self.count += 1
+        q = self.heights
+        n = self.positions
+
+        #extend the outer markers, then find the cell k (q[k] <= x < q[k + 1]) of every value
+        q[0] = np.minimum(q[0], values)
+        q[4] = np.maximum(q[4], values)
+        k = np.sum(q[1:4] <= values, axis=0)
+
+        #markers above the cell move up one position
+        n[1:] += np.arange(1, 5).reshape((4,) + (1,) * values.ndim) > k
+        self.desired += self.increments
+
+        #move the middle markers that are a position or more off, if they can
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            step = np.where(((d >= 1) & (n[i + 1] - n[i] > 1)) |
+                            ((d <= -1) & (n[i - 1] - n[i] < -1)), np.sign(d), 0)
+
+            #piecewise parabolic prediction of the height at the new position
+            parabolic = q[i] + step / (n[i + 1] - n[i - 1]) * \
+                        ((n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                         (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+            #linear prediction, used when the parabolic one leaves the neighbouring markers
+            linear = np.where(step > 0,
+                              q[i] + (q[i + 1] - q[i]) / (n[i + 1] - n[i]),
+                              q[i] - (q[i - 1] - q[i]) / (n[i - 1] - n[i]))
+
+            in_order = (q[i - 1] < parabolic) & (parabolic < q[i + 1])
+            q[i] = np.where(step == 0, q[i], np.where(in_order, parabolic, linear))
+            n[i] += step
+
+    @property
+    def value(self):
+        '''the current estimate of the quantile, exact until the markers start'''
+        if self.started:
+            return self.heights[2].copy()
+        if self.count == 0:
+            return np.zeros(self.shape)
+        return np.quantile(self.samples[:self.count], self.quantile, axis=0)
+
+
+class Curve_summary():
+    '''summary of the S-I-R curves of many runs, updated one run at a time
+
+    Keeps the running mean and variance, and streaming estimates of the
+    given quantiles, of the susceptible, infectious, recovered and
+    fatalities of every frame. Memory is proportional to the number of
+    frames, not to the number of runs. Runs that ended early are padded
+    with the counts of their last frame.
+
+    The curves of the first exact_until runs are kept, and quantiles are
+    computed exactly from them. After that the P2_quantile sketches take
+    over, started from the kept curves, which are then dropped.
+
+    The mean curves are available as susceptible, infectious, recovered and
+    fatalities, as on Population_trackers, so a summary can be plotted with
+    visualiser.plot_sir, which then also draws the bands between the
+    quantiles.
+
+    Keyword arguments
+    -----------------
+    frames : int
+        the number of frames of the curves, the simulation_steps of the runs
+
+    quantiles : list of float
+        the quantiles to estimate, between 0 and 1
+
+    exact_until : int
+        the number of runs to compute quantiles of exactly, at least 5
+    '''
+    def __init__(self, frames, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95), exact_until=30):
+        self.frames = frames
+        self.quantiles = sorted(quantiles)
+        self.moments = Running_moments((frames, 4))
+        #the curves of the first runs, shared by all quantiles, until the sketches start
+        self.samples = np.zeros((max(exact_until, 5), frames, 4), dtype=np.float64)
+        self.sketches = None
+
+    def add_run(self, counts):
+        '''adds the curves of one run
+
+        Keyword arguments
+        -----------------
+        counts : ndarray
+            susceptible, infectious, recovered and fatalities of every frame,
+            shape (frames, 4), as in Population_trackers.counts
+        '''
+
+        curves = np.empty((self.frames, 4), dtype=np.float64)
+        length = min(len(counts), self.frames)
+        curves[:length] = counts[:length]
+        curves[length:] = counts[length - 1]
+
+        if self.sketches is None and self.runs == len(self.samples):
+            self.sketches = [P2_quantile.from_samples(self.samples, quantile)
+                             for quantile in self.quantiles]
+            self.samples = None
+
+        if self.sketches is None:
+            self.samples[self.runs] = curves
+        else:
+            for sketch in self.sketches:
+                sketch.add(curves)
+
+        self.moments.add(curves)
+
+    @property
+    def runs(self):
+        return self.moments.count
+
+    @property
+    def mean(self):
+        '''mean susceptible, infectious, recovered and fatalities, shape (frames, 4)'''
+        return self.moments.mean
+
+    @property
+    def std(self):
+        '''standard deviation of the curves, shape (frames, 4)'''
+        return self.moments.std
+
+    @property
+    def susceptible(self):
+        return self.mean[:,0]
+
+    @property
+    def infectious(self):
+        return self.mean[:,1]
+
+    @property
+    def recovered(self):
+        return self.mean[:,2]
+
+    @property
+    def fatalities(self):
+        return self.mean[:,3]
+
+    def percentile(self, quantile):
+        '''estimate of the given quantile of the curves, shape (frames, 4)
+
+        Exact over the first exact_until runs. The estimates of the sketches
+        are put in order, so bands of different quantiles never cross.
+        Raises ValueError for quantiles that are not kept.
+        '''
+        if quantile not in self.quantiles:
+            raise ValueError('quantile %s is not kept, choose from %s' %(quantile, self.quantiles))
+        if self.runs == 0:
+            return np.zeros((self.frames, 4))
+        if self.sketches is None:
+            return np.quantile(self.samples[:self.runs], quantile, axis=0)
+
+        values = np.sort([sketch.value for sketch in self.sketches], axis=0)
+        return values[self.quantiles.index(quantile)]
+
+    @property
+    def bands(self):
+        '''pairs of quantiles bounding symmetric bands, from the widest inwards'''
+        return [(self.quantiles[i], self.quantiles[-1 - i])
+                for i in range(len(self.quantiles) // 2)]
+
+
+def student_t_factor(confidence, dof):
+    '''returns t such that P(-t <= T <= t) = confidence for Student's t with dof degrees of freedom
+
+    The confidence interval of a mean estimated from n runs is this factor
+    (with n - 1 degrees of freedom) times the standard error. Solves the
+    closed form of the two-sided probability for integer degrees of freedom
+    (Abramowitz and Stegun 26.7.3 and 26.7.4), written in the angle
+    theta = arctan(t / sqrt(dof)), by bisection on theta.
+    '''
+
+    dof = int(dof)
+    if dof < 1:
+        raise ValueError('Student\'s t needs at least one degree of freedom, got %i' %dof)
+
+    #the series in powers of cos(theta): odd powers for odd dof, even powers for even dof
+    terms = dof // 2
+    j = np.arange(1, terms)
+    ratios = 2 * j / (2 * j + 1) if dof % 2 == 1 else (2 * j - 1) / (2 * j)
+    coefficients = np.cumprod(np.concatenate([[1.0], ratios]))[:terms]
+    powers = 2 * np.arange(terms) + dof % 2
+
+    def probability(theta):
+        series = np.sum(coefficients * np.cos(theta) ** powers)
+        if dof % 2 == 1:
+            return 2 / np.pi * (theta + np.sin(theta) * series)
+        return np.sin(theta) * series
+
+    low, high = 0.0, np.pi / 2
+    for i in range(60):
+        theta = (low + high) / 2
+        if probability(theta) < confidence:
+            low = theta
+        else:
+            high = theta
+
+    return np.sqrt(dof) * np.tan((low + high) / 2)
+
+
+def seed_stream(seed=0):
+    '''yields an endless stream of independent seeds, spawned from seed'''
+    seed_sequence = np.random.SeedSequence(seed)
+    while True:
+        yield int(seed_sequence.spawn(1)[0].generate_state(1)[0])
+
+
+def iterate_runs(function, config_values, seeds, workers=None):
+    '''runs function(config_values, seed) for every seed on worker processes
+
+    Yields (seed, result) in the order of the seeds. At most two runs per
+    worker are queued or waiting to be yielded, so seeds are drawn as they
+    are needed and results do not pile up. Stopping the iteration cancels
+    the runs not yet started.
+
+    Keyword arguments
+    -----------------
+    function : callable
+        the function to run, must be importable by the workers
+
+    config_values : dict
+        the configuration of the simulation, see Configuration
+
+    seeds : iterable
+        the seed of every run, may be endless
+
+    workers : int
+        the number of worker processes, defaults to the number of cores
+    '''
+
+    workers = workers or os.cpu_count()
+    #spawn, so workers start clean in stead of inheriting the parent's imports and threads
+    context = multiprocessing.get_context('spawn')
+
+    with ProcessPoolExecutor(max_workers = workers, mp_context = context) as executor:
+        pending = deque()
+        try:
+            for seed in seeds:
+                pending.append((seed, executor.submit(function, config_values, seed)))
+                if len(pending) >= 2 * workers:
+                    seed, future = pending.popleft()
+                    yield seed, future.result()
+
+            while len(pending) > 0:
+                seed, future = pending.popleft()
+                yield seed, future.result()
+        finally:
+            for seed, future in pending:
+                future.cancel()
+
+
+def run_curves(config_values, seed):
+    '''runs one simulation headless and returns its S-I-R curves
+
+    Runs in the worker processes, see sweep.run_headless for the arguments.
+
+    Returns
+    -------
+    counts : ndarray
+        susceptible, infectious, recovered and fatalities of every frame
+    '''
+
+    sim = run_headless(config_values, seed)
+    return sim.pop_tracker.counts[:sim.pop_tracker.length].copy()
+
+
+def run_monte_carlo(base_config, runs=100, seed=0, workers=None,
+                    quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+    '''runs a scenario from many seeds on all cores and summarises the curves
+
+    The curves of every run are added to the summary as soon as they come
+    in and are then dropped, so memory stays proportional to the number of
+    frames however many runs are done.
+
+    Keyword arguments
+    -----------------
+    base_config : Configuration or dict
+        the scenario, see sweep.sweep
+
+    runs : int
+        the number of runs
+
+    seed : int
+        seed from which the seeds of all runs are derived
+
+    workers : int
+        the number of worker processes, defaults to the number of cores
+
+    quantiles : list of float
+        the quantiles of the curves to estimate
+
+    Returns
+    -------
+    summary : Curve_summary
+        mean, variance and quantiles of the curves, see Curve_summary
+    '''
+
+    config_values = get_config_values(base_config)
+    frames = Configuration(**config_values).simulation_steps
+    summary = Curve_summary(frames, quantiles)
+
+    seeds = itertools.islice(seed_stream(seed), runs)
+    for _, counts in iterate_runs(run_curves, config_values, seeds, workers):
+        summary.add_run(counts)
+
+    return summary
+
+
+def run_until_converged(base_config, statistic='peak_infectious', tolerance=1.0,
+                        relative=False, confidence=0.95, min_runs=10, max_runs=1000,
+                        seed=0, workers=None):
+    '''runs a scenario from new seeds until an outcome is estimated precisely enough
+
+    Seeds are dispatched to the workers for as long as needed. After every
+    run, in seed order, the confidence interval of the mean of the statistic
+    is updated, and runs stop as soon as its half-width is below tolerance,
+    or when max_runs is reached. The interval uses Student's t with one
+    degree of freedom less than the number of runs, so it is not too narrow
+    when few runs are in. Scenarios with little variance between
+    runs so need few runs. Because runs are added in seed order, the result
+    does not depend on the number of workers.
+
+    Keyword arguments
+    -----------------
+    base_config : Configuration or dict
+        the scenario, see sweep.sweep
+
+    statistic : str
+        the outcome to estimate, one of the outcomes of sweep.run_point, such
+        as 'peak_infectious' or 'fatalities'
+
+    tolerance : float
+        the half-width of the confidence interval to reach
+
+    relative : bool
+        whether tolerance is a fraction of the mean in stead of an absolute value
+
+    confidence : float
+        the confidence level of the interval, between 0 and 1
+
+    min_runs : int
+        the number of runs before convergence is checked, guards against
+        stopping on a few runs that happen to agree
+
+    max_runs : int
+        the budget, the largest number of runs to do
+
+    seed : int
+        seed from which the seeds of all runs are derived
+
+    workers : int
+        the number of worker processes, defaults to the number of cores
+
+    Returns
+    -------
+    estimate : dict
+        the mean, standard deviation and confidence interval half-width of
+        the statistic, the number of runs and whether the tolerance was reached
+    '''
+
+    if statistic not in RESULT_FIELDS[RESULT_FIELDS.index('frames'):]:
+        raise ValueError('statistic %s not understood! Must be one of the outcomes of sweep.run_point'
+                         %statistic)
+
+    config_values = get_config_values(base_config)
+
+    moments = Running_moments()
+    half_width = np.inf
+    converged = False
+
+    seeds = itertools.islice(seed_stream(seed), max_runs)
+    for _, outcomes in iterate_runs(run_point, config_values, seeds, workers):
+        moments.add(float(outcomes[statistic]))
+
+        if moments.count >= max(min_runs, 2):
+            half_width = student_t_factor(confidence, moments.count - 1) * \
+                         moments.std / np.sqrt(moments.count)
+            target = tolerance * abs(moments.mean) if relative else tolerance
+
+            sys.stdout.write('\r%i runs: %s %.2f +/- %.2f'
+                             %(moments.count, statistic, moments.mean, half_width))
+            if half_width <= target:
+                converged = True
+                #stopping the iteration cancels the runs still queued
+                break
+
+    print('')
+    return {'statistic': statistic,
+            'mean': float(moments.mean),
+            'std': float(moments.std),
+            'half_width': float(half_width),
+            'runs': moments.count,
+            'converged': converged}
@@ -157,3 +157,161 @@ def get_motion_parameters(xmin, ymin, xmax, ymax):
     y_wander = (ymax - ymin) / 2
 
     return x_center, y_center, x_wander, y_wander
+
+
+class Motion_buffers():
+    '''preallocated scratch arrays for update_motion
+
+    Keyword arguments
+    -----------------
+    pop_size : int
+        the size of the population
+
+    dtype : str or dtype
+        the floating point type of the population matrix
+    '''
+    def __init__(self, pop_size, dtype='float64'):
+        self.uniform = np.zeros((pop_size,))
+        self.values = np.zeros((pop_size,))
+        self.scatter = np.zeros((pop_size,))
+        self.step = np.zeros((pop_size,), dtype=dtype)
+        self.positions = np.zeros((pop_size,), dtype=np.int64)
+        self.mask = np.zeros((pop_size,), dtype=bool)
+        self.condition = np.zeros((pop_size,), dtype=bool)
+        self.free_roaming = np.zeros((pop_size,), dtype=bool)
+
+
+def fill_masked(column, mask, count, buffers):
+    '''writes the first 'count' values of buffers.values where mask is True
+
+    Equivalent to column[mask] = buffers.values[:count], without allocating
+    temporary arrays: the running count of the mask gives each selected
+    element the position of its value.
+    '''
+    if count == 0:
+        return
+
+    #cast first, a cumulative sum over the boolean mask itself allocates a buffer
+    np.copyto(buffers.positions, mask)
+    np.cumsum(buffers.positions, out=buffers.positions)
+    np.subtract(buffers.positions, 1, out=buffers.positions)
+    np.take(buffers.values[:count], buffers.positions, out=buffers.scatter, mode='clip')
+    np.copyto(column, buffers.scatter, where=mask)
+
+
+def draw_masked(column, mask, buffers, rng, loc, scale, a_min=None, a_max=None):
+    '''draws gaussian values for the elements of column where mask is True'''
+    count = np.count_nonzero(mask)
+    if count == 0:
+        return
+
+    values = buffers.values[:count]
+    rng.standard_normal(out=values)
+    np.multiply(values, scale, out=values)
+    np.add(values, loc, out=values)
+    if a_min is not None or a_max is not None:
+        np.clip(values, a_min, a_max, out=values)
+
+    fill_masked(column, mask, count, buffers)
+
+
+def update_motion(population, buffers, xbounds, ybounds, rng, speed=0.01,
+                  heading_update_chance=0.02, speed_update_chance=0.02,
+                  lockdown=False, lockdown_vector=[], stopped=[]):
+    '''takes a full motion step in place
+
+    Fuses out_of_bounds, update_randoms and update_positions into one
+    step that works in place on the population with the scratch arrays
+    in buffers, so no arrays are allocated each timestep.
+
+    Keyword arguments
+    -----------------
+    population : ndarray
+        the array containing all the population information
+
+    buffers : Motion_buffers
+        the scratch arrays, sized for the population
+
+    xbounds, ybounds : list or tuple
+        contains the lower and upper bounds of the world [min, max], applied
+        to everyone without an active destination (column 11 == 0)
+
+    rng : numpy.random.Generator
+        the random number generator to draw from
+
+    speed : int or float
+        mean speed of population members
+
+    heading_update_chance : float
+        the odds of updating the heading of each member, each time step
+
+    speed_update_chance : float
+        the odds of updating the speed of each member, each time step
+
+    lockdown : bool
+        if True, speeds are capped at 0.001 and those complying to the lockdown
+        are stopped, in stead of randomizing headings and speeds
+
+    lockdown_vector : ndarray
+        marks those not complying to a lockdown with 1, see Config.set_lockdown.
+        Read on every call, so changes to it take effect straight away
+
+    stopped : ndarray or list
+        IDs of people that do not move, such as the dead
+    '''
+
+    x = population[:,1]
+    y = population[:,2]
+    heading_x = population[:,3]
+    heading_y = population[:,4]
+    speeds = population[:,5]
+    mask = buffers.mask
+    condition = buffers.condition
+
+    #out of bounds, only for those without a destination
+    np.equal(population[:,11], 0, out=buffers.free_roaming)
+
+    for position, heading, bounds in [(x, heading_x, xbounds), (y, heading_y, ybounds)]:
+        #below lower bound and heading further down: new positive heading
+        np.less_equal(position, bounds[0], out=mask)
+        np.less(heading, 0, out=condition)
+        np.logical_and(mask, condition, out=mask)
+        np.logical_and(mask, buffers.free_roaming, out=mask)
+        draw_masked(heading, mask, buffers, rng, 0.5, 0.5 / 3, 0.05, 1)
+
+        #above upper bound and heading further up: new negative heading
+        np.greater_equal(position, bounds[1], out=mask)
+        np.greater(heading, 0, out=condition)
+        np.logical_and(mask, condition, out=mask)
+        np.logical_and(mask, buffers.free_roaming, out=mask)
+        draw_masked(heading, mask, buffers, rng, -0.5, 0.5 / 3, -1, -0.05)
+
+    if lockdown:
+        #reduce speed of all members of society
+        np.minimum(speeds, 0.001, out=speeds)
+        #set speeds of complying people to 0
+        if len(lockdown_vector) == len(population):
+            np.equal(lockdown_vector, 0, out=condition)
+            np.copyto(speeds, 0, where=condition)
+    else:
+        #randomly update headings and speeds
+        for column, chance, loc, scale in [(heading_x, heading_update_chance, 0, 1/3),
+                                           (heading_y, heading_update_chance, 0, 1/3),
+                                           (speeds, speed_update_chance, speed, speed / 3)]:
+            rng.random(out=buffers.uniform)
+            np.less_equal(buffers.uniform, chance, out=mask)
+            draw_masked(column, mask, buffers, rng, loc, scale)
+
+        np.clip(speeds, 0.0001, 0.05, out=speeds)
+
+    #stopped people keep their position
+    if len(stopped) > 0:
+        population[stopped,3:5] = 0
+
+    #update positions
+    np.multiply(heading_x, speeds, out=buffers.step)
+    np.add(x, buffers.step, out=x)
+    np.multiply(heading_y, speeds, out=buffers.step)
+    np.add(y, buffers.step, out=y)
+
+    return population
@@ -0,0 +1,176 @@
+'''
+contains methods to build static contact networks, used in stead of
+motion when Config.infection_engine is 'network'
+'''
+
+import numpy as np
+
+
+class Contact_network():
+    '''undirected contact graph of the population in compressed sparse row layout
+
+    The contacts of person i are neighbours[offsets[i]:offsets[i + 1]]. Every
+    edge is stored in both directions, so following the edges of the
+    infectious reaches everybody they can infect.
+
+    Keyword arguments
+    -----------------
+    offsets : ndarray
+        start of the contacts of every person in neighbours, followed by the
+        total number of stored edges
+
+    neighbours : ndarray
+        IDs of the contacts, grouped by person
+    '''
+    def __init__(self, offsets, neighbours):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.neighbours = np.asarray(neighbours, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def degrees(self):
+        return np.diff(self.offsets)
+
+    def gather(self, ids):
+        '''returns the contacts of all given IDs, concatenated
+
+        Keyword arguments
+        -----------------
+        ids : ndarray
+            the IDs whose contacts to look up
+
+        Returns
+        -------
+        neighbours : ndarray
+            the contacts of every ID in order, people with no contacts add nothing
+        '''
+
+        starts = self.offsets[ids]
+        counts = self.offsets[np.asarray(ids) + 1] - starts
+        total = counts.sum()
+
+        #positions starts[i] .. starts[i] + counts[i] of every ID, in one go
+        positions = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        positions += np.repeat(starts, counts)
+
+        return self.neighbours[positions]
+
+
+def edges_to_network(sources, targets, pop_size):
+    '''builds a Contact_network from a list of undirected edges
+
+    Self loops and duplicate edges are dropped, then every edge is stored in
+    both directions.
+
+    Keyword arguments
+    -----------------
+    sources, targets : ndarray
+        the two ends of every edge
+
+    pop_size : int
+        the size of the population
+    '''
+
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+
+    keep = sources != targets
+    sources = sources[keep]
+    targets = targets[keep]
+
+    #one key per edge and direction, sorting them groups the edges by person
+    keys = np.sort(np.concatenate([sources * pop_size + targets,
+                                   targets * pop_size + sources]))
+    keys = keys[np.concatenate([[True], keys[1:] != keys[:-1]])]
+    rows, columns = np.divmod(keys, pop_size)
+
+    offsets = np.zeros((pop_size + 1,), dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=pop_size), out=offsets[1:])
+
+    return Contact_network(offsets, columns)
+
+
+def build_small_world(pop_size, mean_degree=10, rewire_chance=0.1):
+    '''builds a small-world network (Watts-Strogatz)
+
+    Everyone starts connected to the mean_degree people nearest to them on a
+    ring, after which each edge has rewire_chance of being redirected to a
+    random person.
+
+    Keyword arguments
+    -----------------
+    pop_size : int
+        the size of the population
+
+    mean_degree : int
+        the number of contacts per person on the ring, rounded down to an even number
+
+    rewire_chance : float
+        the odds that an edge is redirected to a random person
+    '''
+
+    half = max(mean_degree // 2, 1)
+
+    sources = np.repeat(np.arange(pop_size, dtype=np.int64), half)
+    targets = (sources + np.tile(np.arange(1, half + 1), pop_size)) % pop_size
+
+    rewired = np.random.random(size=targets.shape) < rewire_chance
+    targets[rewired] = np.random.randint(0, pop_size, size=np.count_nonzero(rewired))
+
+    return edges_to_network(sources, targets, pop_size)
+
+
+def build_scale_free(pop_size, mean_degree=10, exponent=2.5):
+    '''builds a scale-free network (Chung-Lu)
+
+    Everyone gets a weight drawn from a power law with the given exponent.
+    Both ends of every edge are then drawn with odds proportional to these
+    weights, so the expected number of contacts of each person scales with
+    their weight and the degrees follow the same power law.
+
+    Keyword arguments
+    -----------------
+    pop_size : int
+        the size of the population
+
+    mean_degree : int or float
+        the average number of contacts per person
+
+    exponent : float
+        exponent of the degree distribution, larger than 2
+    '''
+
+    weights = np.random.pareto(exponent - 1, size=(pop_size,)) + 1
+    cumulative = np.cumsum(weights)
+    cumulative /= cumulative[-1]
+
+    edge_count = int(pop_size * mean_degree / 2)
+    sources = np.searchsorted(cumulative, np.random.random(size=(edge_count,)))
+    targets = np.searchsorted(cumulative, np.random.random(size=(edge_count,)))
+
+    return edges_to_network(np.minimum(sources, pop_size - 1),
+                            np.minimum(targets, pop_size - 1), pop_size)
+
+
+def initialize_contact_network(Config):
+    '''builds the contact network set in Config.network_type
+
+    Keyword arguments
+    -----------------
+    Config : Configuration
+        the configuration class, provides network_type ('small_world' or
+        'scale_free'), network_mean_degree, network_rewire_chance and
+        network_exponent
+    '''
+
+    if Config.network_type.lower() == 'small_world':
+        return build_small_world(Config.pop_size, Config.network_mean_degree,
+                                 Config.network_rewire_chance)
+    elif Config.network_type.lower() == 'scale_free':
+        return build_scale_free(Config.pop_size, Config.network_mean_degree,
+                                Config.network_exponent)
+    else:
+        raise ValueError('network type %s not understood! Must be either \'small_world\' or \'scale_free\''
+                         %Config.network_type)
@@ -0,0 +1,246 @@
+'''
+contains compiled versions of the per-timestep computations, used when
+Config.backend is 'numba'. Numba is optional: without it the NumPy
+functions are used, see get_backend
+'''
+
+import functools
+import importlib.util
+import threading
+import warnings
+
+import numpy as np
+
+#numba is only imported when a kernel is first called, so processes running
+#on the numpy backend (such as sweep.py workers) never pay for importing it
+NUMBA_AVAILABLE = importlib.util.find_spec('numba') is not None
+compile_lock = threading.Lock()
+
+
+def njit(function):
+    '''compiles function in nopython mode, on its first call
+
+    Compiled functions are cached on disk to skip recompiling at startup, and
+    release the GIL so they can run on several threads at once (see parallel.py).
+    Kernels do not call one another, so they can be compiled one by one.
+    '''
+    if not NUMBA_AVAILABLE:
+        return function
+
+    compiled = []
+
+    @functools.wraps(function)
+    def kernel(*args):
+        if len(compiled) == 0:
+            with compile_lock:
+                if len(compiled) == 0:
+                    import numba
+                    compiled.append(numba.njit(cache=True, nogil=True)(function))
+        return compiled[0](*args)
+
+    return kernel
+
+
+def get_backend(Config):
+    '''returns the backend to use, 'numba' or 'numpy'
+
+    Falls back to 'numpy' with a warning if Config.backend is 'numba' but
+    numba is not installed.
+    '''
+
+    if Config.backend.lower() != 'numba':
+        return 'numpy'
+
+    if not NUMBA_AVAILABLE:
+        warnings.warn('numba is not installed, falling back to the numpy backend')
+        return 'numpy'
+
+    return 'numba'
+
+
+@njit
+def seed_kernels(seed):
+    '''seeds the random number generator used inside the kernels
+
+    Numba keeps its own generator state, separate from numpy's, so kernels
+    are seeded from numpy's generator once (see Simulation.update_movement).
+    '''
+    np.random.seed(seed)
+
+
+@njit
+def move_kernel(population, xbounds, ybounds, speed, heading_update_chance,
+                speed_update_chance, lockdown, lockdown_vector):
+    '''moves everyone for one timestep, in one pass over the population
+
+    Does the work of out_of_bounds (for those without a destination),
+    update_randoms (or the lockdown speed limits), stopping the dead and
+    update_positions, person by person.
+
+    Keyword arguments
+    -----------------
+    population : ndarray
+        the array containing all the population information
+
+    xbounds, ybounds : ndarray
+        lower and upper bounds of the world [min, max], shared by everyone
+
+    speed : float
+        mean speed of the population
+
+    heading_update_chance, speed_update_chance : float
+        the odds of updating the heading or speed of each member, each time step
+
+    lockdown : bool
+        whether a lockdown is in effect
+
+    lockdown_vector : ndarray
+        0 for everyone who complies with a lockdown, 1 otherwise
+    '''
+
+    for i in range(population.shape[0]):
+        #bounce off the world bounds, if roaming freely
+        if population[i,11] == 0:
+            if population[i,1] <= xbounds[0] and population[i,3] < 0:
+                population[i,3] = min(max(np.random.normal(0.5, 0.5 / 3), 0.05), 1)
+            elif population[i,1] >= xbounds[1] and population[i,3] > 0:
+                population[i,3] = min(max(-np.random.normal(0.5, 0.5 / 3), -1), -0.05)
+
+            if population[i,2] <= ybounds[0] and population[i,4] < 0:
+                population[i,4] = min(max(np.random.normal(0.5, 0.5 / 3), 0.05), 1)
+            elif population[i,2] >= ybounds[1] and population[i,4] > 0:
+                population[i,4] = min(max(-np.random.normal(0.5, 0.5 / 3), -1), -0.05)
+
+        if lockdown:
+            #reduce speed of all members of society, stop those who comply
+            population[i,5] = min(population[i,5], 0.001)
+            if lockdown_vector[i] == 0:
+                population[i,5] = 0
+        else:
+            #randomly update headings and speed
+            if np.random.random() <= heading_update_chance:
+                population[i,3] = np.random.normal(0, 1 / 3)
+            if np.random.random() <= heading_update_chance:
+                population[i,4] = np.random.normal(0, 1 / 3)
+            if np.random.random() <= speed_update_chance:
+                population[i,5] = np.random.normal(speed, speed / 3)
+            population[i,5] = min(max(population[i,5], 0.0001), 0.05)
+
+        #the dead stand still
+        if population[i,6] == 3:
+            population[i,3] = 0
+            population[i,4] = 0
+
+        population[i,1] += population[i,3] * population[i,5]
+        population[i,2] += population[i,4] * population[i,5]
+
+
+@njit
+def count_nearby_kernel(source_xy, target_xy, infection_range):
+    '''counts the infectious within the infection zone of every healthy person
+
+    Compiled version of the search in find_nearby_grid: sources are sorted
+    by grid cell of size infection_range, and for every target only the 3x3
+    surrounding cells are searched, with the same open zone test.
+
+    Keyword arguments
+    -----------------
+    source_xy, target_xy : ndarray
+        coordinates of the infectious and the healthy
+
+    infection_range : float
+        the radius around each infected person where transmission of virus can take place
+
+    Returns
+    -------
+    infected_counts : ndarray
+        the number of infectious people near every target
+    '''
+
+    origin_x = min(source_xy[:,0].min(), target_xy[:,0].min())
+    origin_y = min(source_xy[:,1].min(), target_xy[:,1].min())
+
+    source_cells = np.empty((source_xy.shape[0], 2), dtype=np.int64)
+    for i in range(source_xy.shape[0]):
+        source_cells[i,0] = np.int64((source_xy[i,0] - origin_x) // infection_range) + 1
+        source_cells[i,1] = np.int64((source_xy[i,1] - origin_y) // infection_range) + 1
+
+    target_cells = np.empty((target_xy.shape[0], 2), dtype=np.int64)
+    for i in range(target_xy.shape[0]):
+        target_cells[i,0] = np.int64((target_xy[i,0] - origin_x) // infection_range) + 1
+        target_cells[i,1] = np.int64((target_xy[i,1] - origin_y) // infection_range) + 1
+
+    rowlen = max(source_cells[:,1].max(), target_cells[:,1].max()) + 2
+
+    source_keys = source_cells[:,0] * rowlen + source_cells[:,1]
+    order = np.argsort(source_keys)
+    source_keys = source_keys[order]
+
+    infected_counts = np.zeros(target_xy.shape[0], dtype=np.int64)
+
+    for i in range(target_xy.shape[0]):
+        key = target_cells[i,0] * rowlen + target_cells[i,1]
+        for dx in range(-1, 2):
+            for dy in range(-1, 2):
+                neighbour = key + dx * rowlen + dy
+                j = np.searchsorted(source_keys, neighbour)
+                while j < len(source_keys) and source_keys[j] == neighbour:
+                    source = order[j]
+                    if (abs(source_xy[source,0] - target_xy[i,0]) < infection_range and
+                        abs(source_xy[source,1] - target_xy[i,1]) < infection_range):
+                        infected_counts[i] += 1
+                    j += 1
+
+    return infected_counts
+
+
+def find_nearby_numba(population, infection_range, traveling_infects=False,
+                      pop_index=None, exclude=None):
+    '''compiled equivalent of infection.find_nearby_grid, same arguments and returns'''
+
+    if pop_index is not None:
+        sources = pop_index.get(1)
+        targets = pop_index.get(0)
+    else:
+        sources = np.flatnonzero(population[:,6] == 1)
+        targets = np.flatnonzero(population[:,6] == 0)
+
+    if not traveling_infects:
+        sources = sources[population[sources,11] == 0]
+    if exclude is not None:
+        sources = sources[~exclude[sources]]
+        targets = targets[~exclude[targets]]
+
+    if len(sources) == 0 or len(targets) == 0:
+        return np.zeros((0,), dtype=np.int32), np.zeros((0,), dtype=np.int64)
+
+    infected_counts = count_nearby_kernel(np.ascontiguousarray(population[sources][:,1:3]),
+                                          np.ascontiguousarray(population[targets][:,1:3]),
+                                          infection_range)
+    exposed = infected_counts > 0
+
+    return np.int32(targets[exposed]), infected_counts[exposed]
+
+
+@njit
+def resolve_kernel(population, indices, mortality_chance):
+    '''lets each of the given infected people recover or die
+
+    Compiled version of the dice roll in recover_or_die: sets the state of
+    every person to 3 (dead) with their mortality chance, to 2 (immune)
+    otherwise, and ends their treatment.
+
+    Returns
+    -------
+    died : ndarray
+        boolean array marking who of indices died
+    '''
+
+    died = np.zeros(len(indices), dtype=np.bool_)
+    for i in range(len(indices)):
+        person = indices[i]
+        died[i] = np.random.random() <= mortality_chance[i]
+        population[person,6] = 3 if died[i] else 2
+        population[person,10] = 0
+
+    return died
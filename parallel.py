@@ -0,0 +1,135 @@
+'''
+contains the multi-threaded timestep, used when Config.threads is larger than 1
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from infection import count_nearby_grid
+from motion import Motion_buffers, update_motion
+from numba_kernels import count_nearby_kernel
+
+
+class Tile_pool():
+    '''runs motion and the infection search on a pool of threads
+
+    Motion is independent per person, so the population is split in blocks of
+    consecutive IDs, one per thread, that are moved in place by update_motion.
+    For the infection search the world is split in vertical strips (tiles)
+    holding equal numbers of healthy people. Each tile is searched with the
+    infectious inside it plus those in an overlap band of infection_range
+    around it, so nobody within range of a healthy person is missed. NumPy
+    (and the numba kernels) release the GIL during the heavy work, so the
+    threads run side by side.
+
+    Every block draws from its own generator, seeded from (seed, frame, block),
+    and tile results are written back in a fixed order, so runs are
+    reproducible regardless of which thread finishes first.
+
+    Keyword arguments
+    -----------------
+    Config : Configuration
+        the configuration class, provides threads and pop_size
+
+    dtype : str or dtype
+        the floating point type of the population matrix
+
+    seed : int
+        base seed of the per-block random number generators
+    '''
+    def __init__(self, Config, dtype='float64', seed=0):
+        self.threads = Config.threads
+        self.seed = seed
+        self.executor = ThreadPoolExecutor(max_workers = self.threads)
+
+        #blocks of consecutive IDs for the motion step
+        self.bounds = np.linspace(0, Config.pop_size, self.threads + 1).astype(np.int64)
+        self.buffers = [Motion_buffers(end - start, dtype)
+                        for start, end in zip(self.bounds[:-1], self.bounds[1:])]
+
+    def shutdown(self):
+        '''stops the threads'''
+        self.executor.shutdown()
+
+    def move(self, population, xbounds, ybounds, frame, speed=0.01,
+             lockdown=False, lockdown_vector=[], stopped=[]):
+        '''takes a motion step for everyone, one block of IDs per thread
+
+        See motion.update_motion for the arguments, frame is the current
+        timestep and seeds the generators of the blocks.
+        '''
+
+        stopped = np.asarray(stopped, dtype=np.int64)
+        lockdown_vector = np.asarray(lockdown_vector)
+
+        def move_block(block):
+            start, end = self.bounds[block], self.bounds[block + 1]
+            rng = np.random.default_rng([self.seed, frame, block])
+            block_stopped = stopped[(stopped >= start) & (stopped < end)] - start
+            block_vector = lockdown_vector[start:end] if len(lockdown_vector) > 0 else lockdown_vector
+
+            update_motion(population[start:end], self.buffers[block], xbounds, ybounds, rng,
+                          speed = speed, lockdown = lockdown, lockdown_vector = block_vector,
+                          stopped = block_stopped)
+
+        #list() waits for all blocks and raises any errors
+        list(self.executor.map(move_block, range(self.threads)))
+
+        return population
+
+    def find_nearby(self, population, infection_range, traveling_infects=False,
+                    pop_index=None, exclude=None, backend='numpy'):
+        '''tiled equivalent of infection.find_nearby_grid, same arguments and returns
+
+        Returns the same people and counts as find_nearby_grid. backend
+        selects the search within each tile, 'numpy' or 'numba'.
+        '''
+
+        if pop_index is not None:
+            sources = pop_index.get(1)
+            targets = pop_index.get(0)
+        else:
+            sources = np.flatnonzero(population[:,6] == 1)
+            targets = np.flatnonzero(population[:,6] == 0)
+
+        if not traveling_infects:
+            sources = sources[population[sources,11] == 0]
+        if exclude is not None:
+            sources = sources[~exclude[sources]]
+            targets = targets[~exclude[targets]]
+
+        if len(sources) == 0 or len(targets) == 0:
+            return np.zeros((0,), dtype=np.int32), np.zeros((0,), dtype=np.int64)
+
+        source_xy = population[sources][:,1:3]
+        target_xy = population[targets][:,1:3]
+
+        #strips with equal numbers of healthy people, the last edge is inclusive
+        edges = np.quantile(target_xy[:,0], np.linspace(0, 1, self.threads + 1))
+        edges[-1] = np.inf
+        count_fn = count_nearby_kernel if backend == 'numba' else count_nearby_grid
+
+        def search_tile(tile):
+            left, right = edges[tile], edges[tile + 1]
+            in_tile = np.flatnonzero((target_xy[:,0] >= left) & (target_xy[:,0] < right))
+            #infectious in the tile or in the overlap band around it. The differences are
+            #taken as in the zone test, so rounding cannot leave out anyone in range
+            in_band = ((left - source_xy[:,0] < infection_range) &
+                       (source_xy[:,0] - right < infection_range))
+
+            if len(in_tile) == 0 or not in_band.any():
+                return in_tile, np.zeros((len(in_tile),), dtype=np.int64)
+
+            return in_tile, count_fn(np.ascontiguousarray(source_xy[in_band]),
+                                     np.ascontiguousarray(target_xy[in_tile]),
+                                     infection_range)
+
+        #merge in tile order, every healthy person is in exactly one tile
+        infected_counts = np.zeros((len(targets),), dtype=np.int64)
+        for in_tile, tile_counts in self.executor.map(search_tile, range(self.threads)):
+            infected_counts[in_tile] = tile_counts
+
+        exposed = infected_counts > 0
+
+        return np.int32(targets[exposed]), infected_counts[exposed]
@@ -6,6 +6,7 @@ and path planning
 import numpy as np
 
 from motion import get_motion_parameters, update_randoms
+from population import Destination_registry
 
 def go_to_location(patient, destination, location_bounds, dest_no=1):
     '''sends patient to defined location
@@ -29,9 +30,7 @@ def go_to_location(patient, destination, location_bounds, dest_no=1):
         the location number, used as index for destinations array if multiple possible
         destinations are defined`.
 
-
-    TODO: vectorize
-
+    See go_to_location_batch to send many people at once.
     '''
 
     x_center, y_center, x_wander, y_wander = get_motion_parameters(location_bounds[0],
@@ -49,6 +48,101 @@ def go_to_location(patient, destination, location_bounds, dest_no=1):
     return patient, destination
 
 
+def go_to_location_batch(population, destinations, ids, location_bounds, dest_no=1):
+    '''sends a group of people to defined locations
+
+    Vectorized version of go_to_location: sets the location as active
+    for all given people at once.
+
+    Keyword arguments
+    -----------------
+    population : ndarray
+        the array containing all the population information
+
+    destinations : ndarray or Destination_registry
+        the array containing all destinations information. With a registry,
+        the location is stored once as destination dest_no
+
+    ids : ndarray
+        IDs of the people to send
+
+    location_bounds : list, tuple or ndarray
+        defines bounds for the location the people will roam in when sent
+        there. format: [xmin, ymin, xmax, ymax], or an array of shape (len(ids), 4)
+        to send everyone to their own location
+
+    dest_no : int
+        the location number, used as index for destinations array if multiple possible
+        destinations are defined.
+    '''
+
+    location_bounds = np.asarray(location_bounds)
+
+    if isinstance(destinations, Destination_registry):
+        if location_bounds.ndim > 1:
+            raise ValueError('a destination registry holds one location per destination number, \
+use a destination matrix to send people to their own locations')
+        destinations.set_destination(dest_no, *location_bounds)
+        population[ids,11] = dest_no #set destination active
+        return population, destinations
+
+    x_center, y_center, x_wander, y_wander = get_motion_parameters(location_bounds[...,0],
+                                                                    location_bounds[...,1],
+                                                                    location_bounds[...,2],
+                                                                    location_bounds[...,3])
+    population[ids,13] = x_wander
+    population[ids,14] = y_wander
+
+    destinations[ids,(dest_no - 1) * 2] = x_center
+    destinations[ids,((dest_no - 1) * 2) + 1] = y_center
+
+    population[ids,11] = dest_no #set destination active
+
+    return population, destinations
+
+
+def get_destination_parameters(population, destinations, ids):
+    '''returns the destination coordinates and wander ranges of the given people
+
+    Looks up the destination number in column 11 of each person and gathers
+    the matching center for all destination numbers at once. With a
+    destination matrix, centers come from each person's own row and the
+    wander ranges from columns 13 and 14; with a Destination_registry both
+    come from the row of the destination in the registry.
+
+    Keyword arguments
+    -----------------
+    population : ndarray
+        the array containing all the population information
+
+    destinations : ndarray or Destination_registry
+        the array containing all destinations information
+
+    ids : ndarray
+        IDs of people with an active destination (column 11 != 0)
+
+    Returns
+    -------
+    dest_x, dest_y, wander_x, wander_y : ndarray
+    '''
+
+    dest_no = np.int64(population[ids,11])
+
+    if isinstance(destinations, Destination_registry):
+        dest_x = destinations.centers[dest_no,0]
+        dest_y = destinations.centers[dest_no,1]
+        wander_x = destinations.wander_ranges[dest_no,0]
+        wander_y = destinations.wander_ranges[dest_no,1]
+    else:
+        dest_columns = (dest_no - 1) * 2
+        dest_x = destinations[ids, dest_columns]
+        dest_y = destinations[ids, dest_columns + 1]
+        wander_x = population[ids,13]
+        wander_y = population[ids,14]
+
+    return dest_x, dest_y, wander_x, wander_y
+
+
 def set_destination(population, destinations):
     '''sets destination of population
 
@@ -64,31 +158,20 @@ def set_destination(population, destinations):
         the array containing all destinations information
     '''
     
-    #how many destinations are active
-    active_dests = np.unique(population[:,11][population[:,11] != 0])
+    #everyone with an active destination that has not arrived yet
+    traveling = np.flatnonzero((population[:,11] != 0) & (population[:,12] == 0))
 
     #set destination
-    for d in active_dests:
-        dest_x = destinations[:,int((d - 1) * 2)]
-        dest_y = destinations[:,int(((d - 1) * 2) + 1)]
-
-        #compute new headings
-        head_x = dest_x - population[:,1]
-        head_y = dest_y - population[:,2]
-
-        #head_x = head_x / np.sqrt(head_x)
-        #head_y = head_y / np.sqrt(head_y)
-
-        #reinsert headings into population of those not at destination yet
-        population[:,3][(population[:,11] == d) &
-                        (population[:,12] == 0)] = head_x[(population[:,11] == d) &
-                                                            (population[:,12] == 0)]
-        population[:,4][(population[:,11] == d) &
-                        (population[:,12] == 0)] = head_y[(population[:,11] == d) &
-                                                            (population[:,12] == 0)]
-        #set speed to 0.01
-        population[:,5][(population[:,11] == d) &
-                        (population[:,12] == 0)] = 0.02
+    dest_x, dest_y, wander_x, wander_y = get_destination_parameters(population, destinations,
+                                                                    traveling)
+
+    #compute new headings
+    #reinsert headings into population of those not at destination yet
+    population[traveling,3] = dest_x - population[traveling,1]
+    population[traveling,4] = dest_y - population[traveling,2]
+
+    #set speed to 0.02
+    population[traveling,5] = 0.02
 
     return population
 
@@ -113,33 +196,25 @@ def check_at_destination(population, destinations, wander_factor=1.5, speed = 0.
         is triggered
     '''
 
-    #how many destinations are active
-    active_dests = np.unique(population[:,11][(population[:,11] != 0)])
-
-    #see who is at destination
-    for d in active_dests:
-        dest_x = destinations[:,int((d - 1) * 2)]
-        dest_y = destinations[:,int(((d - 1) * 2) + 1)]
+    #everyone with an active destination that has not arrived yet
+    traveling = np.flatnonzero((population[:,11] != 0) & (population[:,12] == 0))
+    dest_x, dest_y, wander_x, wander_y = get_destination_parameters(population, destinations,
+                                                                    traveling)
 
-        #see who arrived at destination and filter out who already was there
-        at_dest = population[(np.abs(population[:,1] - dest_x) < (population[:,13] * wander_factor)) & 
-                                (np.abs(population[:,2] - dest_y) < (population[:,14] * wander_factor)) &
-                                (population[:,12] == 0)]
+    #see who arrived at destination and filter out who already was there
+    arrived = traveling[(np.abs(population[traveling,1] - dest_x) < (wander_x * wander_factor)) &
+                        (np.abs(population[traveling,2] - dest_y) < (wander_y * wander_factor))]
 
-        if len(at_dest) > 0:
-            #mark those as arrived
-            at_dest[:,12] = 1
-            #insert random headings and speeds for those at destination
-            at_dest = update_randoms(at_dest, pop_size = len(at_dest), speed = speed,
-                                     heading_update_chance = 1, speed_update_chance = 1)
-
-            #at_dest[:,5] = 0.001
-
-            #reinsert into population
-            population[(np.abs(population[:,1] - dest_x) < (population[:,13] * wander_factor)) & 
-                        (np.abs(population[:,2] - dest_y) < (population[:,14] * wander_factor)) &
-                        (population[:,12] == 0)] = at_dest
+    if len(arrived) > 0:
+        at_dest = population[arrived]
+        #mark those as arrived
+        at_dest[:,12] = 1
+        #insert random headings and speeds for those at destination
+        at_dest = update_randoms(at_dest, pop_size = len(at_dest), speed = speed,
+                                 heading_update_chance = 1, speed_update_chance = 1)
 
+        #reinsert into population
+        population[arrived] = at_dest
 
     return population
         
@@ -163,56 +238,41 @@ def keep_at_destination(population, destinations, wander_factor=1):
         is triggered
     ''' 
 
-    #how many destinations are active
-    active_dests = np.unique(population[:,11][(population[:,11] != 0) &
-                                                (population[:,12] == 1)])
-
-    for d in active_dests:
-        dest_x = destinations[:,int((d - 1) * 2)][(population[:,12] == 1) &
-                                                    (population[:,11] == d)]
-        dest_y = destinations[:,int(((d - 1) * 2) + 1)][(population[:,12] == 1) &
-                                                        (population[:,11] == d)]
-
-        #see who is marked as arrived
-        arrived = population[(population[:,12] == 1) &
-                                (population[:,11] == d)]
-
-        ids = np.int32(arrived[:,0]) # find unique IDs of arrived persons
-        
-        #check if there are those out of bounds
-        #replace x oob
-        #where x larger than destination + wander, AND heading wrong way, set heading negative
-        shp = arrived[:,3][arrived[:,1] > (dest_x + (arrived[:,13] * wander_factor))].shape
-
-        arrived[:,3][arrived[:,1] > (dest_x + (arrived[:,13] * wander_factor))] = -np.random.normal(loc = 0.5,
-                                                                scale = 0.5 / 3,
-                                                                size = shp)
-
-
-        #where x smaller than destination - wander, set heading positive
-        shp = arrived[:,3][arrived[:,1] < (dest_x - (arrived[:,13] * wander_factor))].shape
-        arrived[:,3][arrived[:,1] < (dest_x - (arrived[:,13] * wander_factor))] = np.random.normal(loc = 0.5,
-                                                            scale = 0.5 / 3,
-                                                            size = shp)
-        #where y larger than destination + wander, set heading negative
-        shp = arrived[:,4][arrived[:,2] > (dest_y + (arrived[:,14] * wander_factor))].shape
-        arrived[:,4][arrived[:,2] > (dest_y + (arrived[:,14] * wander_factor))] = -np.random.normal(loc = 0.5,
-                                                                scale = 0.5 / 3,
-                                                                size = shp)
-        #where y smaller than destination - wander, set heading positive
-        shp = arrived[:,4][arrived[:,2] < (dest_y - (arrived[:,14] * wander_factor))].shape
-        arrived[:,4][arrived[:,2] < (dest_y - (arrived[:,14] * wander_factor))] = np.random.normal(loc = 0.5,
-                                                            scale = 0.5 / 3,
-                                                            size = shp)
-
-        #slow speed
-        arrived[:,5] = np.random.normal(loc = 0.005,
-                                        scale = 0.005 / 3, 
-                                        size = arrived[:,5].shape)
-
-        #reinsert into population
-        population[(population[:,12] == 1) &
-                    (population[:,11] == d)] = arrived
+    #see who is marked as arrived
+    ids = np.flatnonzero((population[:,11] != 0) & (population[:,12] == 1))
+    arrived = population[ids]
+
+    dest_x, dest_y, wander_x, wander_y = get_destination_parameters(population, destinations, ids)
+
+    #check if there are those out of bounds
+    #replace x oob
+    #where x larger than destination + wander, AND heading wrong way, set heading negative
+    oob = arrived[:,1] > (dest_x + (wander_x * wander_factor))
+    arrived[:,3][oob] = -np.random.normal(loc = 0.5, scale = 0.5 / 3,
+                                          size = np.count_nonzero(oob))
+
+    #where x smaller than destination - wander, set heading positive
+    oob = arrived[:,1] < (dest_x - (wander_x * wander_factor))
+    arrived[:,3][oob] = np.random.normal(loc = 0.5, scale = 0.5 / 3,
+                                         size = np.count_nonzero(oob))
+
+    #where y larger than destination + wander, set heading negative
+    oob = arrived[:,2] > (dest_y + (wander_y * wander_factor))
+    arrived[:,4][oob] = -np.random.normal(loc = 0.5, scale = 0.5 / 3,
+                                          size = np.count_nonzero(oob))
+
+    #where y smaller than destination - wander, set heading positive
+    oob = arrived[:,2] < (dest_y - (wander_y * wander_factor))
+    arrived[:,4][oob] = np.random.normal(loc = 0.5, scale = 0.5 / 3,
+                                         size = np.count_nonzero(oob))
+
+    #slow speed
+    arrived[:,5] = np.random.normal(loc = 0.005,
+                                    scale = 0.005 / 3, 
+                                    size = arrived[:,5].shape)
+
+    #reinsert into population
+    population[ids] = arrived
                                 
     return population
 
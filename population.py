@@ -52,7 +52,7 @@ def initialize_population(Config, mean_age=45, max_age=105,
     '''
 
     #initialize population matrix
-    population = np.zeros((Config.pop_size, 15))
+    population = np.zeros((Config.pop_size, 15), dtype=Config.precision)
 
     #initalize unique IDs
     population[:,0] = [x for x in range(Config.pop_size)]
@@ -74,11 +74,11 @@ def initialize_population(Config, mean_age=45, max_age=105,
 
     #initalize ages
     std_age = (max_age - mean_age) / 3
-    population[:,7] = np.int32(np.random.normal(loc = mean_age, 
-                                                scale = std_age, 
-                                                size=(Config.pop_size,)))
+    ages = np.int32(np.random.normal(loc = mean_age, 
+                                     scale = std_age, 
+                                     size=(Config.pop_size,)))
 
-    population[:,7] = np.clip(population[:,7], a_min = 0, 
+    population[:,7] = np.clip(ages, a_min = 0, 
                               a_max = max_age) #clip those younger than 0 years
 
     #build recovery_vector
@@ -87,7 +87,77 @@ def initialize_population(Config, mean_age=45, max_age=105,
     return population
 
 
-def initialize_destination_matrix(pop_size, total_destinations):
+class Households():
+    '''household membership of the population in compressed sparse row layout
+
+    The IDs of the members of household h are members[offsets[h]:offsets[h + 1]].
+    Every household has at least one member and everyone is in exactly one
+    household, so sums over households are single segment reductions
+    (np.add.reduceat) over values gathered in members order.
+
+    Keyword arguments
+    -----------------
+    offsets : ndarray
+        start of every household in members, followed by the total number of members
+
+    members : ndarray
+        IDs of the population, grouped by household
+    '''
+    def __init__(self, offsets, members):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.members = np.asarray(members, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def sizes(self):
+        return np.diff(self.offsets)
+
+    def household_totals(self, values):
+        '''sums values (one per person) over every household'''
+        return np.add.reduceat(values[self.members], self.offsets[:-1])
+
+    def member_totals(self, values):
+        '''sums values over every household, returned per member in members order'''
+        return np.repeat(self.household_totals(values), self.sizes)
+
+
+def initialize_households(pop_size, mean_household_size=2.5, max_household_size=6):
+    '''randomly divides the population into households
+
+    Household sizes are 1 plus a poisson draw, capped at max_household_size,
+    and people are assigned to households in random order.
+
+    Keyword arguments
+    -----------------
+    pop_size : int
+        the size of the population
+
+    mean_household_size : int or float
+        the average number of people per household (before capping)
+
+    max_household_size : int
+        the largest household size allowed
+    '''
+
+    #draw enough households to hold everyone, then cut the last one short
+    draws = int(pop_size / max(mean_household_size, 1)) + 1
+    sizes = np.zeros((0,), dtype=np.int64)
+    while sizes.sum() < pop_size:
+        extra = 1 + np.random.poisson(max(mean_household_size - 1, 0), size=(draws,))
+        sizes = np.concatenate([sizes, np.minimum(extra, max_household_size)])
+
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    offsets = offsets[offsets < pop_size]
+    offsets = np.append(offsets, pop_size)
+
+    members = np.random.permutation(pop_size)
+
+    return Households(offsets, members)
+
+
+def initialize_destination_matrix(pop_size, total_destinations, dtype='float64'):
     '''intializes the destination matrix
 
     function that initializes the destination matrix used to
@@ -101,13 +171,61 @@ def initialize_destination_matrix(pop_size, total_destinations):
     total_destinations : int
         the number of destinations to maintain in the matrix. Set to more than
         one if for example people can go to work, supermarket, home, etc.
+
+    dtype : str or dtype
+        the floating point type of the matrix, see Config.precision
     '''
 
-    destinations = np.zeros((pop_size, total_destinations * 2))
+    destinations = np.zeros((pop_size, total_destinations * 2), dtype=dtype)
 
     return destinations
 
 
+class Destination_registry():
+    '''table of destinations shared by the whole population
+
+    Compact alternative to the destination matrix: in stead of storing the
+    coordinates of every destination for every person, holds one row per
+    destination with its center and wander ranges. Which destination
+    someone is heading to is given by the destination number in column 11
+    of the population matrix, so memory grows with the population plus the
+    number of destinations, not their product. Row 0 stands for 'no
+    destination' and is never used.
+
+    Keyword arguments
+    -----------------
+    total_destinations : int
+        the number of destinations to reserve room for, more are added as needed
+
+    dtype : str or dtype
+        the floating point type of the table, see Config.precision
+    '''
+    def __init__(self, total_destinations=1, dtype='float64'):
+        self.centers = np.zeros((total_destinations + 1, 2), dtype=dtype)
+        self.wander_ranges = np.zeros((total_destinations + 1, 2), dtype=dtype)
+
+    def __len__(self):
+        return len(self.centers) - 1
+
+    def set_destination(self, dest_no, xmin, ymin, xmax, ymax):
+        '''defines the area of destination dest_no'''
+        if dest_no > len(self):
+            extra = dest_no - len(self)
+            self.centers = np.concatenate([self.centers, np.zeros((extra, 2), dtype=self.centers.dtype)])
+            self.wander_ranges = np.concatenate([self.wander_ranges,
+                                                 np.zeros((extra, 2), dtype=self.wander_ranges.dtype)])
+
+        x_center, y_center, x_wander, y_wander = get_motion_parameters(xmin, ymin, xmax, ymax)
+        self.centers[dest_no] = [x_center, y_center]
+        self.wander_ranges[dest_no] = [x_wander, y_wander]
+
+    def add_destination(self, xmin, ymin, xmax, ymax):
+        '''adds a new destination and returns its destination number'''
+        dest_no = len(self) + 1
+        self.set_destination(dest_no, xmin, ymin, xmax, ymax)
+        return dest_no
+
+
 def set_destination_bounds(population, destinations, xmin, ymin, 
                            xmax, ymax, dest_no=1, teleport=True):
     '''teleports all persons within limits
@@ -121,7 +239,7 @@ def set_destination_bounds(population, destinations, xmin, ymin,
     population : ndarray
         the array containing all the population information
 
-    destinations : ndarray
+    destinations : ndarray or Destination_registry
         the array containing all the destination information
 
     xmin, ymin, xmax, ymax : int or float
@@ -140,17 +258,21 @@ def set_destination_bounds(population, destinations, xmin, ymin,
         population[:,1] = np.random.uniform(low = xmin, high = xmax, size = len(population))
         population[:,2] = np.random.uniform(low = ymin, high = ymax, size = len(population))
 
-    #get parameters
-    x_center, y_center, x_wander, y_wander = get_motion_parameters(xmin, ymin, 
-                                                                   xmax, ymax)
+    if isinstance(destinations, Destination_registry):
+        #center and wander bounds are shared through the registry
+        destinations.set_destination(dest_no, xmin, ymin, xmax, ymax)
+    else:
+        #get parameters
+        x_center, y_center, x_wander, y_wander = get_motion_parameters(xmin, ymin, 
+                                                                       xmax, ymax)
 
-    #set destination centers
-    destinations[:,(dest_no - 1) * 2] = x_center
-    destinations[:,((dest_no - 1) * 2) + 1] = y_center
+        #set destination centers
+        destinations[:,(dest_no - 1) * 2] = x_center
+        destinations[:,((dest_no - 1) * 2) + 1] = y_center
 
-    #set wander bounds
-    population[:,13] = x_wander
-    population[:,14] = y_wander
+        #set wander bounds
+        population[:,13] = x_wander
+        population[:,14] = y_wander
 
     population[:,11] = dest_no #set destination active
     population[:,12] = 1 #set destination reached
@@ -209,29 +331,306 @@ class Population_trackers():
     Can track population parameters over time that can then be used
     to compute statistics or to visualise. 
 
-    TODO: track age cohorts here as well
+    Counts are kept in arrays preallocated for Config.simulation_steps
+    timesteps, which grow when more steps are taken. The number of people
+    in each state is also tracked per age cohort of 'cohort_size' years.
+    All counts of a timestep come from a single np.bincount over the
+    population, and the peak and cumulative number of infectious people
+    are kept up to date as counts come in.
     '''
-    def __init__(self):
-        self.susceptible = []
-        self.infectious = []
-        self.recovered = []
-        self.fatalities = []
+    def __init__(self, Config=None, cohort_size=10):
+        if Config is not None:
+            capacity = Config.simulation_steps
+            max_age = Config.max_age
+        else:
+            capacity = 1000
+            max_age = 105
+
+        self.length = 0
+        #columns: susceptible, infectious, recovered, fatalities
+        self.counts = np.zeros((max(capacity, 1), 4), dtype=np.int64)
+
+        #number of people per (cohort, state) for every timestep
+        self.cohort_size = cohort_size
+        self.num_cohorts = int(max_age // cohort_size) + 1
+        self.cohort_counts = np.zeros((max(capacity, 1), self.num_cohorts, 5), dtype=np.int32)
+        #bin of each person for the combined cohort and state bincount
+        self.cohort_bins = None
+
+        #running aggregates
+        self.peak_infectious = 0
+        self.peak_infectious_frame = 0
+        self.cumulative_infectious = 0 #sum of infectious people over all timesteps
 
         #PLACEHOLDER - whether recovered individual can be reinfected
         self.reinfect = False 
 
+    @property
+    def susceptible(self):
+        return self.counts[:self.length,0]
+
+    @property
+    def infectious(self):
+        return self.counts[:self.length,1]
+
+    @property
+    def recovered(self):
+        return self.counts[:self.length,2]
+
+    @property
+    def fatalities(self):
+        return self.counts[:self.length,3]
+
+    @property
+    def cohorts(self):
+        '''number of people per age cohort and state, shape (timesteps, cohorts, 5)'''
+        return self.cohort_counts[:self.length]
+
+    def grow(self):
+        '''doubles the number of timesteps that can be tracked'''
+        self.counts = np.concatenate([self.counts, np.zeros_like(self.counts)])
+        self.cohort_counts = np.concatenate([self.cohort_counts,
+                                             np.zeros_like(self.cohort_counts)])
+
     def update_counts(self, population):
-        '''docstring
+        '''counts the people in each state and appends them to the trackers
+
+        Keyword arguments
+        -----------------
+        population : ndarray
+            the array containing all the population information
         '''
         pop_size = population.shape[0]
-        self.infectious.append(len(population[population[:,6] == 1]))
-        self.recovered.append(len(population[population[:,6] == 2]))
-        self.fatalities.append(len(population[population[:,6] == 3]))
+
+        if self.cohort_bins is None or len(self.cohort_bins) != pop_size:
+            cohorts = np.clip(np.int64(population[:,7]) // self.cohort_size,
+                              0, self.num_cohorts - 1)
+            self.cohort_bins = cohorts * 5
+
+        #count everyone per cohort and state in one pass
+        cohort_counts = np.bincount(self.cohort_bins + np.int64(population[:,6]),
+                                    minlength = self.num_cohorts * 5)
+
+        self.append_counts(cohort_counts.reshape((self.num_cohorts, 5)), pop_size)
+
+    def append_counts(self, cohort_counts, pop_size):
+        '''appends the counts of one timestep to the trackers
+
+        Keyword arguments
+        -----------------
+        cohort_counts : ndarray
+            the number of people per age cohort and state, shape (cohorts, 5)
+
+        pop_size : int
+            the size of the population
+        '''
+
+        if self.length == len(self.counts):
+            self.grow()
+
+        self.cohort_counts[self.length] = cohort_counts
+
+        state_counts = cohort_counts.sum(axis=0)
+        infectious = state_counts[1]
+        recovered = state_counts[2]
+        fatalities = state_counts[3]
 
         if self.reinfect:
-            self.susceptible.append(pop_size - (self.infectious[-1] +
-                                                self.fatalities[-1]))
+            susceptible = pop_size - (infectious + fatalities)
+        else:
+            susceptible = pop_size - (infectious + recovered + fatalities)
+
+        self.counts[self.length] = [susceptible, infectious, recovered, fatalities]
+
+        if infectious > self.peak_infectious:
+            self.peak_infectious = infectious
+            self.peak_infectious_frame = self.length
+        self.cumulative_infectious += infectious
+
+        self.length += 1
+
+class Index_set():
+    '''set of population IDs that supports fast batch updates
+
+    Members are kept in the first 'size' slots of a preallocated array, with
+    the position of every member stored per ID. Adding appends to the end,
+    removing fills the holes with members from the end, so both cost time
+    proportional to the number of IDs changed, not to the population size.
+    The order of members is therefore arbitrary.
+    '''
+    def __init__(self, capacity):
+        self.members = np.zeros((capacity,), dtype=np.int32)
+        self.position = np.full((capacity,), -1, dtype=np.int64)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def indices(self):
+        '''IDs in the set (a view, copy it before changing the set)'''
+        return self.members[:self.size]
+
+    def contains(self, ids):
+        '''returns a boolean array marking which of the IDs are in the set'''
+        return self.position[ids] >= 0
+
+    def add(self, ids):
+        '''adds IDs to the set, IDs already present are ignored'''
+        ids = np.unique(np.asarray(ids, dtype=np.int32))
+        ids = ids[self.position[ids] < 0]
+
+        self.members[self.size:self.size + len(ids)] = ids
+        self.position[ids] = np.arange(self.size, self.size + len(ids))
+        self.size += len(ids)
+
+    def remove(self, ids):
+        '''removes IDs from the set, IDs not present are ignored'''
+        ids = np.unique(np.asarray(ids, dtype=np.int32))
+        ids = ids[self.position[ids] >= 0]
+        if len(ids) == 0:
+            return
+
+        new_size = self.size - len(ids)
+        holes = self.position[ids]
+        self.position[ids] = -1
+
+        #move the members that remain from the tail into the holes before it
+        holes = holes[holes < new_size]
+        tail = self.members[new_size:self.size]
+        movers = tail[self.position[tail] >= 0]
+
+        self.members[holes] = movers
+        self.position[movers] = holes
+        self.size = new_size
+
+    def clear(self):
+        '''removes all IDs from the set'''
+        self.position[self.indices] = -1
+        self.size = 0
+
+    def set_members(self, ids):
+        '''replaces the members with the given IDs, keeping their order'''
+        self.clear()
+        ids = np.asarray(ids, dtype=np.int32)
+        self.members[:len(ids)] = ids
+        self.position[ids] = np.arange(len(ids))
+        self.size = len(ids)
+
+
+class Population_index():
+    '''keeps the IDs of the population per state and per flag
+
+    Holds an Index_set for each state in column 6 (0=healthy, 1=sick,
+    2=immune, 3=dead, 4=immune but infectious), for those in treatment
+    (column 10 == 1) and for those with an active destination (column 11 != 0),
+    so that these groups can be sliced directly in stead of found with a
+    boolean mask over the whole population.
+
+    Changes made through set_state(), set_treatment() and set_destination()
+    are recorded straight away. After changing the population in any other
+    way (by editing the matrix, for example in a callback), call
+    mark_changed(): Simulation then calls sync() once to pick the changes up.
+    '''
+    def __init__(self, population):
+        pop_size = len(population)
+        self.states = [Index_set(pop_size) for x in range(5)]
+        self.treatment = Index_set(pop_size)
+        self.destination = Index_set(pop_size)
+
+        #per ID, the state and flags the index holds, to compare the population with
+        self.state = np.full((pop_size,), -1, dtype=np.int8)
+        self.in_treatment = np.zeros((pop_size,), dtype=bool)
+        self.has_destination = np.zeros((pop_size,), dtype=bool)
+        #whether the population was changed without going through the index
+        self.changed = False
+        #ID arrays of those who became sick (state 1), until taken by take_new_infected()
+        self.new_infected = []
+
+        self.rebuild(population)
+
+    def rebuild(self, population):
+        '''rebuilds the index from scratch from the population matrix'''
+        for state, index_set in enumerate(self.states):
+            index_set.clear()
+            index_set.add(np.flatnonzero(population[:,6] == state))
+
+        self.treatment.clear()
+        self.treatment.add(np.flatnonzero(population[:,10] == 1))
+        self.destination.clear()
+        self.destination.add(np.flatnonzero(population[:,11] != 0))
+
+        self.state[:] = population[:,6]
+        self.in_treatment[:] = population[:,10] == 1
+        self.has_destination[:] = population[:,11] != 0
+        self.changed = False
+        self.new_infected = [self.get(1).copy()]
+
+    def mark_changed(self):
+        '''notes that the population was changed without going through the index'''
+        self.changed = True
+
+    def sync(self, population):
+        '''records changes made to the population without going through the index
+
+        Compares the state, treatment and destination columns with what the
+        index holds and moves only the people that differ, so it costs one
+        pass over these three columns. Simulation only calls it when
+        mark_changed() was called.
+        '''
+        self.changed = False
+
+        changed = np.flatnonzero(population[:,6] != self.state)
+        if len(changed) > 0:
+            states = np.int64(population[changed,6])
+            for state in range(len(self.states)):
+                self.set_state(changed[states == state], state)
+
+        for flags, column, set_flags in [(self.in_treatment, population[:,10] == 1, self.set_treatment),
+                                         (self.has_destination, population[:,11] != 0, self.set_destination)]:
+            changed = np.flatnonzero(column != flags)
+            if len(changed) > 0:
+                set_flags(changed[column[changed]], True)
+                set_flags(changed[~column[changed]], False)
+
+    def get(self, state):
+        '''returns the IDs of everyone in the given state'''
+        return self.states[state].indices
+
+    def count(self, state):
+        '''returns the number of people in the given state'''
+        return len(self.states[state])
+
+    def take_new_infected(self):
+        '''returns the IDs that became sick since the last call, and forgets them'''
+        new_infected = np.concatenate(self.new_infected) if len(self.new_infected) > 0 \
+                       else np.zeros((0,), dtype=np.int32)
+        self.new_infected = []
+        return np.int32(new_infected)
+
+    def set_state(self, ids, state):
+        '''records that the given IDs have moved to the given state'''
+        if state == 1:
+            ids = np.asarray(ids, dtype=np.int32)
+            self.new_infected.append(ids[self.state[ids] != 1])
+        for other_state, index_set in enumerate(self.states):
+            if other_state != state:
+                index_set.remove(ids)
+        self.states[state].add(ids)
+        self.state[ids] = state
+
+    def set_treatment(self, ids, in_treatment=True):
+        '''records that the given IDs have entered or left treatment'''
+        if in_treatment:
+            self.treatment.add(ids)
+        else:
+            self.treatment.remove(ids)
+        self.in_treatment[ids] = in_treatment
+
+    def set_destination(self, ids, active=True):
+        '''records that the given IDs have had their destination set or cleared'''
+        if active:
+            self.destination.add(ids)
         else:
-            self.susceptible.append(pop_size - (self.infectious[-1] +
-                                                self.recovered[-1] +
-                                                self.fatalities[-1]))
\ No newline at end of file
+            self.destination.remove(ids)
+        self.has_destination[ids] = active
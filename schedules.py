@@ -0,0 +1,124 @@
+'''
+contains methods related to daily activity schedules, moving people
+between home, work, school and other destinations over the day
+'''
+
+import numpy as np
+
+
+class Daily_schedule():
+    '''daily activity schedules shared by groups of people
+
+    A day is divided in slots of slot_length frames. Each schedule template
+    is a row of the templates table, giving the destination number to head
+    to during every slot of the day (0 means no destination: roaming free).
+    Every person follows one template, stored as a small integer per person,
+    so moving everybody at the start of a slot is a single table lookup.
+
+    Destinations are defined as usual, through set_destination_bounds or
+    Destination_registry.add_destination. With several destinations a
+    Destination_registry is recommended (Config.destination_storage), as the
+    destination matrix keeps a single wander range per person, and has to
+    hold every destination number the schedule uses. Destination 1 is the
+    self-isolation location (Simulation.isolation_location), which schedules
+    cannot use.
+
+    Keyword arguments
+    -----------------
+    templates : ndarray or list
+        table of shape (number of templates, slots per day) holding the
+        destination number of each slot
+
+    assignment : ndarray or list
+        the template each person follows, one entry per person
+
+    slot_length : int
+        the number of frames in each slot of the day
+    '''
+    def __init__(self, templates, assignment, slot_length=10):
+        templates = np.asarray(templates)
+        assignment = np.asarray(assignment)
+
+        if templates.ndim != 2:
+            raise ValueError('templates should be a table of shape (templates, slots per day)')
+        if templates.size > 0 and templates.min() < 0:
+            raise ValueError('templates hold destination numbers, which cannot be negative')
+        if len(assignment) > 0 and (assignment.min() < 0 or assignment.max() >= len(templates)):
+            raise ValueError('assignment refers to templates that do not exist')
+
+        #store in the smallest integer types that fit
+        self.templates = templates.astype(np.min_scalar_type(templates.max()))
+        self.assignment = assignment.astype(np.min_scalar_type(len(templates) - 1))
+        self.slot_length = slot_length
+        self.current_slot = None
+
+    @classmethod
+    def from_proportions(cls, templates, proportions, pop_size, slot_length=10):
+        '''randomly assigns templates to the population in the given proportions'''
+        assignment = np.random.choice(len(proportions), size = pop_size, p = proportions)
+        return cls(templates, assignment, slot_length)
+
+    @property
+    def slots_per_day(self):
+        return self.templates.shape[1]
+
+    def get_slot(self, frame):
+        '''returns the slot of the day the frame falls in'''
+        return (frame // self.slot_length) % self.slots_per_day
+
+    def destinations_at(self, slot):
+        '''returns the destination number of every person during the slot'''
+        return self.templates[self.assignment, slot]
+
+    def reset(self):
+        '''forgets the current slot, so the next update places everyone'''
+        self.current_slot = None
+
+
+def update_schedules(population, schedule, frame, pop_index=None):
+    '''moves people to the next destination of their schedule
+
+    Does nothing until a new slot of the day starts. Then everyone who is
+    still following their schedule (at the destination of the previous slot,
+    or without a destination) gets the destination of the new slot. People
+    sent elsewhere, for instance into self-isolation, are left alone until
+    their destination is reset. The dead and those in treatment never move.
+
+    Keyword arguments
+    -----------------
+    population : ndarray
+        the array containing all the population information
+
+    schedule : Daily_schedule
+        the schedules of the population
+
+    frame : int
+        the current timestep of the simulation
+
+    pop_index : Population_index
+        optional index of the population, kept in sync when given
+    '''
+
+    slot = schedule.get_slot(frame)
+    if slot == schedule.current_slot:
+        return population
+
+    current = population[:,11]
+    following = current == 0
+    if schedule.current_slot is not None:
+        following |= current == schedule.destinations_at(schedule.current_slot)
+    following &= (population[:,6] != 3) & (population[:,10] == 0)
+
+    new_destinations = schedule.destinations_at(slot)
+    ids = np.flatnonzero(following & (current != new_destinations))
+    new_destinations = new_destinations[ids]
+
+    population[ids,11] = new_destinations
+    population[ids,12] = 0 #underway
+    schedule.current_slot = slot
+
+    if pop_index is not None:
+        pop_index.set_destination(ids[new_destinations != 0])
+        pop_index.set_destination(ids[new_destinations == 0], active = False)
+
+    return population
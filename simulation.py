@@ -2,20 +2,25 @@ import os
 import sys
 
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
 
 from config import Configuration, config_error
 from environment import build_hospital
 from infection import find_nearby, infect, recover_or_die, compute_mortality,\
-healthcare_infection_correction
+healthcare_infection_correction, Recovery_scheduler
 from motion import update_positions, out_of_bounds, update_randoms,\
-get_motion_parameters
+get_motion_parameters, update_motion, Motion_buffers
 from path_planning import go_to_location, set_destination, check_at_destination,\
 keep_at_destination, reset_destinations
 from population import initialize_population, initialize_destination_matrix,\
-set_destination_bounds, save_data, save_population, Population_trackers
-from visualiser import build_fig, draw_tstep, set_style, plot_sir
+set_destination_bounds, save_data, save_population, Population_trackers,\
+Population_index, Destination_registry, initialize_households
+from network import initialize_contact_network
+from numba_kernels import get_backend, seed_kernels, move_kernel
+from parallel import Tile_pool
+from schedules import update_schedules
+from checkpoint import save_checkpoint, restore_checkpoint
+#the visualiser (and with it matplotlib) is imported where it is used,
+#so headless runs such as sweep.py workers never load matplotlib
 
 #set seed for reproducibility
 #np.random.seed(100)
@@ -25,27 +30,82 @@ from visualiser import build_fig, draw_tstep, set_style, plot_sir
 
 class Simulation():
     #TODO: if lockdown or otherwise stopped: destination -1 means no motion
+
+    #destination number of the self-isolation location, reserved: schedules cannot use it
+    isolation_location = 1
+
     def __init__(self, *args, **kwargs):
         #load default config data
         self.Config = Configuration(*args, **kwargs)
         self.frame = 0
 
+        #IDs and frames are stored in the population matrix, check they fit exactly
+        self.Config.check_precision()
+
+        if self.Config.venue_transmission and self.Config.destination_storage.lower() != 'registry':
+            raise config_error('venue transmission needs destination_storage \'registry\', '
+                               'where every destination number stands for one place')
+        #steps taken by the current call to run(), kept in checkpoints so runs can resume
+        self.run_step = 0
+        self.fig = None
+
         #initialize default population
         self.population_init()
 
-        self.pop_tracker = Population_trackers()
+        self.pop_tracker = Population_trackers(self.Config)
 
         #initalise destinations vector
-        self.destinations = initialize_destination_matrix(self.Config.pop_size, 1)
+        self.destinations_init()
+
+        #keeps track of when the infected are due to recover or die
+        self.recovery_scheduler = Recovery_scheduler(self.Config)
+
+        #scratch arrays and generator for the fused motion step, made on first use
+        self.motion_buffers = None
+        self.rng = None
+        self.kernels_seeded = False
+        self.tile_pool = None
+
+        #daily activity schedules, see schedules.Daily_schedule. None disables them
+        self.schedule = None
+
+
+    @property
+    def schedule(self):
+        return self._schedule
+
+    @schedule.setter
+    def schedule(self, schedule):
+        '''sets the daily activity schedules, checking the destinations they use'''
+        if schedule is not None and np.any(schedule.templates == self.isolation_location):
+            raise config_error('destination %i is reserved for self-isolation and cannot be '
+                               'used in a schedule' %self.isolation_location)
+
+        #the destination matrix has two columns per destination
+        if schedule is not None and isinstance(self.destinations, np.ndarray) and \
+           schedule.templates.max() > self.destinations.shape[1] // 2:
+            raise config_error('the schedule uses destination %i, but the destination matrix holds %i. '
+                               'Use destination_storage \'registry\', or a larger matrix from '
+                               'population.initialize_destination_matrix'
+                               %(schedule.templates.max(), self.destinations.shape[1] // 2))
+        self._schedule = schedule
 
 
     def reinitialise(self):
         '''reset the simulation'''
 
         self.frame = 0
+        self.run_step = 0
         self.population_init()
-        self.pop_tracker = Population_trackers()
-        self.destinations = initialize_destination_matrix(self.Config.pop_size, 1)
+        self.pop_tracker = Population_trackers(self.Config)
+        self.destinations_init()
+        self.recovery_scheduler = Recovery_scheduler(self.Config)
+        self.motion_buffers = None
+        if self.tile_pool is not None:
+            self.tile_pool.shutdown()
+            self.tile_pool = None
+        if self.schedule is not None:
+            self.schedule.reset()
 
 
     def population_init(self):
@@ -54,111 +114,233 @@ class Simulation():
                                                 self.Config.max_age, self.Config.xbounds,
                                                 self.Config.ybounds)
 
+        #IDs per state, treatment and destination, kept up to date each step
+        self.pop_index = Population_index(self.population)
+
+        #who is in contact with whom, replaces motion in network mode
+        self.network = None
+        if self.Config.infection_engine.lower() == 'network':
+            self.network = initialize_contact_network(self.Config)
+
+        #who lives with whom, for transmission within households
+        self.households = None
+        if self.Config.household_transmission:
+            self.households = initialize_households(self.Config.pop_size,
+                                                    self.Config.mean_household_size,
+                                                    self.Config.max_household_size)
+
+
+    def destinations_init(self):
+        '''(re-)initializes destinations, see Config.destination_storage'''
+        if self.Config.destination_storage.lower() == 'registry':
+            self.destinations = Destination_registry(1, dtype = self.Config.precision)
+        else:
+            self.destinations = initialize_destination_matrix(self.Config.pop_size, 1,
+                                                              dtype = self.Config.precision)
+
 
     def tstep(self):
         '''
         takes a time step in the simulation
         '''
 
-        if self.frame == 0 and self.Config.visualise:
+        if self.Config.visualise and (self.frame == 0 or self.fig is None):
             #initialize figure
+            from visualiser import build_fig
             self.fig, self.spec, self.ax1, self.ax2 = build_fig(self.Config)
 
-        #check destinations if active
-        #define motion vectors if destinations active and not everybody is at destination
-        active_dests = len(self.population[self.population[:,11] != 0]) # look op this only once
-
-        if active_dests > 0 and len(self.population[self.population[:,12] == 0]) > 0:
-            self.population = set_destination(self.population, self.destinations)
-            self.population = check_at_destination(self.population, self.destinations,
-                                                   wander_factor = self.Config.wander_factor_dest,
-                                                   speed = self.Config.speed)
-
-        if active_dests > 0 and len(self.population[self.population[:,12] == 1]) > 0:
-            #keep them at destination
-            self.population = keep_at_destination(self.population, self.destinations,
-                                                  self.Config.wander_factor)
-
-        #out of bounds
-        #define bounds arrays, excluding those who are marked as having a custom destination
-        if len(self.population[:,11] == 0) > 0:
-            _xbounds = np.array([[self.Config.xbounds[0] + 0.02, self.Config.xbounds[1] - 0.02]] * len(self.population[self.population[:,11] == 0]))
-            _ybounds = np.array([[self.Config.ybounds[0] + 0.02, self.Config.ybounds[1] - 0.02]] * len(self.population[self.population[:,11] == 0]))
-            self.population[self.population[:,11] == 0] = out_of_bounds(self.population[self.population[:,11] == 0],
-                                                                        _xbounds, _ybounds)
-
-        #set randoms
-        if self.Config.lockdown:
-            if len(self.pop_tracker.infectious) == 0:
-                mx = 0
-            else:
-                mx = np.max(self.pop_tracker.infectious)
-
-            if len(self.population[self.population[:,6] == 1]) >= len(self.population) * self.Config.lockdown_percentage or\
-               mx >= (len(self.population) * self.Config.lockdown_percentage):
-                #reduce speed of all members of society
-                self.population[:,5] = np.clip(self.population[:,5], a_min = None, a_max = 0.001)
-                #set speeds of complying people to 0
-                self.population[:,5][self.Config.lockdown_vector == 0] = 0
-            else:
-                #update randoms
-                self.population = update_randoms(self.population, self.Config.pop_size, self.Config.speed)
-        else:
-            #update randoms
-            self.population = update_randoms(self.population, self.Config.pop_size, self.Config.speed)
+        #pick up changes made to the population outside of the simulation
+        if self.pop_index.changed:
+            self.pop_index.sync(self.population)
 
-        #for dead ones: set speed and heading to 0
-        self.population[:,3:5][self.population[:,6] == 3] = 0
+        #move people along their daily schedules
+        if self.schedule is not None:
+            self.population = update_schedules(self.population, self.schedule,
+                                               self.frame, self.pop_index)
 
-        #update positions
-        self.population = update_positions(self.population)
+        #move everyone, people in a contact network have no positions to update
+        if self.Config.infection_engine.lower() != 'network':
+            self.update_movement()
 
         #find new infections
         self.population, self.destinations = infect(self.population, self.Config, self.frame,
                                                     send_to_location = self.Config.self_isolate,
                                                     location_bounds = self.Config.isolation_bounds,
                                                     destinations = self.destinations,
-                                                    location_no = 1,
-                                                    location_odds = self.Config.self_isolate_proportion)
+                                                    location_no = self.isolation_location,
+                                                    location_odds = self.Config.self_isolate_proportion,
+                                                    scheduler = self.recovery_scheduler,
+                                                    pop_index = self.pop_index,
+                                                    households = self.households,
+                                                    network = self.network,
+                                                    tile_pool = self.tile_pool)
 
         #recover and die
-        self.population = recover_or_die(self.population, self.frame, self.Config)
+        self.population = recover_or_die(self.population, self.frame, self.Config,
+                                         scheduler = self.recovery_scheduler,
+                                         pop_index = self.pop_index)
 
         #send cured back to population if self isolation active
         #perhaps put in recover or die class
-        #send cured back to population
-        self.population[:,11][self.population[:,6] == 2] = 0
+        #send cured back to population, only from the isolation location,
+        #and not those whose schedule has them there anyway
+        active_dests = self.pop_index.destination.indices
+        cured = active_dests[(self.population[active_dests,6] == 2) &
+                             (self.population[active_dests,11] == self.isolation_location)]
+        if self.schedule is not None and self.schedule.current_slot is not None:
+            scheduled = self.schedule.destinations_at(self.schedule.current_slot)[cured]
+            cured = cured[scheduled != self.isolation_location]
+        self.population[cured,11] = 0
+        self.pop_index.set_destination(cured, False)
 
         #update population statistics
         self.pop_tracker.update_counts(self.population)
 
         #visualise
         if self.Config.visualise:
+            from visualiser import draw_tstep
             draw_tstep(self.Config, self.population, self.pop_tracker, self.frame,
-                       self.fig, self.spec, self.ax1, self.ax2)
+                       self.fig, self.spec, self.ax1, self.ax2,
+                       pop_index = self.pop_index)
 
         #report stuff to console
         sys.stdout.write('\r')
         sys.stdout.write('%i: healthy: %i, infected: %i, immune: %i, in treatment: %i, \
 dead: %i, of total: %i' %(self.frame, self.pop_tracker.susceptible[-1], self.pop_tracker.infectious[-1],
-                        self.pop_tracker.recovered[-1], len(self.population[self.population[:,10] == 1]),
+                        self.pop_tracker.recovered[-1], len(self.pop_index.treatment),
                         self.pop_tracker.fatalities[-1], self.Config.pop_size))
 
         #save popdata if required
         if self.Config.save_pop and (self.frame % self.Config.save_pop_freq) == 0:
             save_population(self.population, self.frame, self.Config.save_pop_folder)
-        #run callback
+        #run callback, and record the changes it made in the index
         self.callback()
+        if self.pop_index.changed:
+            self.pop_index.sync(self.population)
 
         #update frame
         self.frame += 1
 
 
+    def update_movement(self):
+        '''moves the population for one timestep
+
+        Steers people with a destination, applies the lockdown if in effect
+        and updates headings, speeds and positions of everyone.
+        '''
+
+        #check destinations if active
+        #define motion vectors if destinations active and not everybody is at destination
+        active_dests = self.pop_index.destination.indices # look op this only once
+        arrived = self.population[active_dests,12] == 1
+
+        if len(active_dests) > 0 and not arrived.all():
+            self.population = set_destination(self.population, self.destinations)
+            self.population = check_at_destination(self.population, self.destinations,
+                                                   wander_factor = self.Config.wander_factor_dest,
+                                                   speed = self.Config.speed)
+
+        if len(active_dests) > 0 and arrived.any():
+            #keep them at destination
+            self.population = keep_at_destination(self.population, self.destinations,
+                                                  self.Config.wander_factor)
+
+        #check if a lockdown is in effect
+        lockdown_active = False
+        if self.Config.lockdown:
+            mx = self.pop_tracker.peak_infectious
+
+            if self.pop_index.count(1) >= len(self.population) * self.Config.lockdown_percentage or\
+               mx >= (len(self.population) * self.Config.lockdown_percentage):
+                lockdown_active = True
+
+        if self.Config.threads > 1:
+            if self.tile_pool is None:
+                #seeded from numpy's global generator, so np.random.seed still applies
+                self.tile_pool = Tile_pool(self.Config, self.Config.precision,
+                                           seed = np.random.randint(0, 2**31 - 1))
+
+            #bounce, randomize and move everyone in place, one block of people per thread
+            self.population = self.tile_pool.move(self.population,
+                                                  [self.Config.xbounds[0] + 0.02, self.Config.xbounds[1] - 0.02],
+                                                  [self.Config.ybounds[0] + 0.02, self.Config.ybounds[1] - 0.02],
+                                                  self.frame, speed = self.Config.speed,
+                                                  lockdown = lockdown_active,
+                                                  lockdown_vector = self.Config.lockdown_vector,
+                                                  stopped = self.pop_index.get(3))
+
+        elif get_backend(self.Config) == 'numba':
+            if not self.kernels_seeded:
+                #seeded from numpy's global generator, so np.random.seed still applies
+                seed_kernels(np.random.randint(0, 2**31 - 1))
+                self.kernels_seeded = True
+
+            #bounce, randomize and move everyone in one compiled pass
+            move_kernel(self.population,
+                        np.array([self.Config.xbounds[0] + 0.02, self.Config.xbounds[1] - 0.02]),
+                        np.array([self.Config.ybounds[0] + 0.02, self.Config.ybounds[1] - 0.02]),
+                        self.Config.speed, 0.02, 0.02, lockdown_active,
+                        np.asarray(self.Config.lockdown_vector, dtype=np.float64))
+
+        elif self.Config.motion_engine.lower() == 'fused':
+            if self.motion_buffers is None:
+                self.motion_buffers = Motion_buffers(self.Config.pop_size, self.Config.precision)
+            if self.rng is None:
+                #seeded from numpy's global generator, so np.random.seed still applies
+                self.rng = np.random.default_rng(np.random.randint(0, 2**31 - 1))
+
+            #bounce, randomize and move everyone in place, the dead stand still
+            self.population = update_motion(self.population, self.motion_buffers,
+                                            [self.Config.xbounds[0] + 0.02, self.Config.xbounds[1] - 0.02],
+                                            [self.Config.ybounds[0] + 0.02, self.Config.ybounds[1] - 0.02],
+                                            self.rng, speed = self.Config.speed,
+                                            lockdown = lockdown_active,
+                                            lockdown_vector = self.Config.lockdown_vector,
+                                            stopped = self.pop_index.get(3))
+        else:
+            #out of bounds
+            #define bounds arrays, excluding those who are marked as having a custom destination
+            if len(active_dests) < self.Config.pop_size:
+                if len(active_dests) > 0:
+                    free_roaming = self.population[:,11] == 0
+                else:
+                    free_roaming = slice(None)
+                free_count = self.Config.pop_size - len(active_dests)
+                _xbounds = np.array([[self.Config.xbounds[0] + 0.02, self.Config.xbounds[1] - 0.02]] * free_count,
+                                    dtype = self.Config.precision)
+                _ybounds = np.array([[self.Config.ybounds[0] + 0.02, self.Config.ybounds[1] - 0.02]] * free_count,
+                                    dtype = self.Config.precision)
+                self.population[free_roaming] = out_of_bounds(self.population[free_roaming],
+                                                              _xbounds, _ybounds)
+
+            #set randoms
+            if lockdown_active:
+                #reduce speed of all members of society
+                self.population[:,5] = np.clip(self.population[:,5], a_min = None, a_max = 0.001)
+                #set speeds of complying people to 0
+                self.population[:,5][self.Config.lockdown_vector == 0] = 0
+            else:
+                #update randoms
+                self.population = update_randoms(self.population, self.Config.pop_size, self.Config.speed)
+
+            #for dead ones: set speed and heading to 0
+            self.population[self.pop_index.get(3),3:5] = 0
+
+            #update positions
+            self.population = update_positions(self.population)
+
+
     def callback(self):
         '''placeholder function that can be overwritten.
 
         By ovewriting this method any custom behaviour can be implemented.
         The method is called after every simulation timestep.
+
+        Record changes to the population made here in self.pop_index, with
+        its set_state(), set_treatment() and set_destination() methods. After
+        editing the population matrix directly, call self.pop_index.mark_changed()
+        in stead, so the index is resynced from the matrix once. Anyone
+        infected here is scheduled to recover or die in the next timestep.
         '''
 
         if self.frame == 50:
@@ -166,27 +348,40 @@ dead: %i, of total: %i' %(self.frame, self.pop_tracker.susceptible[-1], self.pop
             self.population[0][6] = 1
             self.population[0][8] = 50
             self.population[0][10] = 1
+            self.pop_index.set_state([0], 1)
+            self.pop_index.set_treatment([0])
 
 
     def run(self):
         '''run simulation'''
 
-        i = 0
+        #frames go on from earlier runs
+        self.Config.check_precision(frames = self.frame + self.Config.simulation_steps - self.run_step)
+
+        #pick up changes made to the population before the run
+        self.pop_index.sync(self.population)
 
-        while i < self.Config.simulation_steps:
+        #a simulation restored from a checkpoint continues where its run was interrupted
+        while self.run_step < self.Config.simulation_steps:
             try:
                 self.tstep()
             except KeyboardInterrupt:
                 print('\nCTRL-C caught, exiting')
                 sys.exit(1)
 
+            self.run_step += 1
+
             #check whether to end if no infecious persons remain.
             #check if self.frame is above some threshold to prevent early breaking when simulation
             #starts initially with no infections.
             if self.Config.endif_no_infections and self.frame >= 500:
-                if len(self.population[(self.population[:,6] == 1) |
-                                       (self.population[:,6] == 4)]) == 0:
-                    i = self.Config.simulation_steps
+                if self.pop_index.count(1) + self.pop_index.count(4) == 0:
+                    self.run_step = self.Config.simulation_steps
+
+            if self.Config.checkpoint_freq > 0 and (self.frame % self.Config.checkpoint_freq) == 0:
+                self.save_checkpoint(self.Config.checkpoint_path)
+
+        self.run_step = 0
 
         if self.Config.save_data:
             save_data(self.population, self.pop_tracker)
@@ -194,21 +389,186 @@ dead: %i, of total: %i' %(self.frame, self.pop_tracker.susceptible[-1], self.pop
         #report outcomes
         print('\n-----stopping-----\n')
         print('total timesteps taken: %i' %self.frame)
-        print('total dead: %i' %len(self.population[self.population[:,6] == 3]))
-        print('total recovered: %i' %len(self.population[self.population[:,6] == 2]))
-        print('total infected: %i' %len(self.population[self.population[:,6] == 1]))
-        print('total infectious: %i' %len(self.population[(self.population[:,6] == 1) |
-                                                          (self.population[:,6] == 4)]))
-        print('total unaffected: %i' %len(self.population[self.population[:,6] == 0]))
+        print('total dead: %i' %self.pop_index.count(3))
+        print('total recovered: %i' %self.pop_index.count(2))
+        print('total infected: %i' %self.pop_index.count(1))
+        print('total infectious: %i' %(self.pop_index.count(1) + self.pop_index.count(4)))
+        print('total unaffected: %i' %self.pop_index.count(0))
+
+
+    def save_checkpoint(self, path='checkpoint.npz'):
+        '''saves the full state of the simulation to path, see checkpoint.save_checkpoint'''
+        save_checkpoint(self, path)
+
+
+    @classmethod
+    def from_checkpoint(cls, path='checkpoint.npz'):
+        '''makes a simulation from a checkpoint, see checkpoint.restore_checkpoint
+
+        Also restores numpy's global random number generator, so calling
+        run() continues the interrupted run exactly as it would have gone.
+        '''
+        sim = cls.__new__(cls)
+        return restore_checkpoint(sim, path)
 
 
     def plot_sir(self, size=(6,3), include_fatalities=False,
                  title='S-I-R plot of simulation'):
+        from visualiser import plot_sir
         plot_sir(self.Config, self.pop_tracker, size, include_fatalities,
                  title)
 
 
 
+def validate_precision(seed=100, **kwargs):
+    '''reports drift of the S-I-R curves of a float32 run against float64
+
+    Runs the same scenario, from the same seed, once with Config.precision
+    set to 'float64' and once with 'float32', and compares the resulting
+    population trackers. Small rounding differences change individual
+    trajectories, so the runs diverge in detail over time; the drift shows
+    whether the epidemic as a whole still develops the same way.
+
+    Keyword arguments
+    -----------------
+    seed : int
+        the seed for numpy's random number generator used for both runs
+
+    kwargs
+        any configuration values for the scenario, for example pop_size or
+        simulation_steps. Visualisation and verbose reporting are turned off.
+
+    Returns
+    -------
+    drift : dict
+        for each of susceptible, infectious, recovered and fatalities, the
+        maximum and final absolute difference as a fraction of the population
+    '''
+
+    kwargs['visualise'] = False
+    kwargs['verbose'] = False
+
+    trackers = {}
+    for precision in ['float64', 'float32']:
+        np.random.seed(seed)
+        sim = Simulation(precision = precision, **kwargs)
+        sim.run()
+        trackers[precision] = sim.pop_tracker
+        pop_size = sim.Config.pop_size
+
+    drift = {}
+    print('\nS-I-R drift of float32 against float64 (fraction of population):')
+    for curve in ['susceptible', 'infectious', 'recovered', 'fatalities']:
+        drift[curve] = curve_drift(getattr(trackers['float64'], curve),
+                                   getattr(trackers['float32'], curve), pop_size)
+        print('%s: max %.4f, final %.4f' %(curve, drift[curve]['max'], drift[curve]['final']))
+
+    return drift
+
+
+def curve_drift(reference, other, pop_size):
+    '''returns the maximum and final absolute difference of two curves
+
+    Runs can end at different frames, the shorter curve holds its final value.
+    Differences are given as a fraction of pop_size.
+    '''
+
+    reference, other = pad_curves([reference, other])
+    difference = np.abs(reference - other) / pop_size
+
+    return {'max': difference.max(), 'final': difference[-1]}
+
+
+def pad_curves(curves):
+    '''pads curves of different lengths to the longest one by holding their final values'''
+    length = max(len(curve) for curve in curves)
+    return [np.pad(np.asarray(curve, dtype=np.float64), (0, length - len(curve)), mode='edge')
+            for curve in curves]
+
+
+def compare_infection_engines(engine='meanfield', reference='grid', seeds=range(10), **kwargs):
+    '''reports how closely an infection engine follows an exact reference
+
+    Runs the same scenario for every seed with both engines. Whether an
+    outbreak takes off at all is mostly down to chance in its first few
+    infections, so the share of runs in which more than 10% of the
+    population got infected is compared separately. The S-I-R curves, peak
+    and attack rate are then averaged over those outbreaks and compared.
+    The 'grid' and 'default' engines are exact and find the same exposures,
+    'grid' is the faster one.
+
+    Keyword arguments
+    -----------------
+    engine : str
+        the infection engine to assess, see Config.infection_engine
+
+    reference : str
+        the exact infection engine to compare against
+
+    seeds : iterable
+        seeds for numpy's random number generator, one pair of runs per seed
+
+    kwargs
+        any configuration values for the scenario, for example pop_size or
+        simulation_steps. Visualisation and verbose reporting are turned off.
+
+    Returns
+    -------
+    comparison : dict
+        for each of susceptible, infectious, recovered and fatalities, the
+        maximum and final absolute difference of the average outbreak curves
+        as a fraction of the population. Under 'outbreaks', per engine the
+        share of runs with an outbreak, the average attack rate and the
+        average height (as a fraction of the population) and frame of the
+        infection peak of those outbreaks
+    '''
+
+    kwargs['visualise'] = False
+    kwargs['verbose'] = False
+    seeds = list(seeds)
+
+    curves = {}
+    outbreaks = {}
+    for infection_engine in [reference, engine]:
+        trackers = []
+        for seed in seeds:
+            np.random.seed(seed)
+            sim = Simulation(infection_engine = infection_engine, **kwargs)
+            sim.run()
+            trackers.append(sim.pop_tracker)
+        pop_size = sim.Config.pop_size
+
+        #compare outbreaks only, fall back on all runs if none took off
+        took_off = [tracker for tracker in trackers if tracker.susceptible[-1] < 0.9 * pop_size]
+        selected = took_off if len(took_off) > 0 else trackers
+
+        curves[infection_engine] = {curve: np.mean(pad_curves([getattr(tracker, curve) for tracker in selected]),
+                                                   axis=0)
+                                    for curve in ['susceptible', 'infectious', 'recovered', 'fatalities']}
+        outbreaks[infection_engine] = {'share': len(took_off) / len(trackers),
+                                       'attack_rate': 1 - curves[infection_engine]['susceptible'][-1] / pop_size,
+                                       'peak_height': np.mean([tracker.peak_infectious
+                                                               for tracker in selected]) / pop_size,
+                                       'peak_frame': np.mean([tracker.peak_infectious_frame
+                                                              for tracker in selected])}
+
+    comparison = {}
+    print('\nS-I-R difference of %s against %s, averaged over outbreaks (fraction of population):'
+          %(engine, reference))
+    for curve in ['susceptible', 'infectious', 'recovered', 'fatalities']:
+        comparison[curve] = curve_drift(curves[reference][curve], curves[engine][curve], pop_size)
+        print('%s: max %.4f, final %.4f' %(curve, comparison[curve]['max'], comparison[curve]['final']))
+
+    comparison['outbreaks'] = outbreaks
+    for infection_engine in [reference, engine]:
+        print('%s: outbreak in %.0f%% of %i runs, attack rate %.3f, peak %.3f at frame %.0f'
+              %(infection_engine, 100 * outbreaks[infection_engine]['share'], len(seeds),
+                outbreaks[infection_engine]['attack_rate'], outbreaks[infection_engine]['peak_height'],
+                outbreaks[infection_engine]['peak_frame']))
+
+    return comparison
+
+
 if __name__ == '__main__':
 
     #initialize
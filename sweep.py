@@ -0,0 +1,242 @@
+'''
+contains the parameter sweep runner, that runs a scenario headless for every
+point of a parameter grid on all cores, and its command line interface
+
+example, sweeping lockdown compliance at high density (2000 people on 1x1):
+
+    python sweep.py --set lockdown=True --set world_size=[1,1] --set simulation_steps=5000 \
+--grid lockdown_compliance=0.0,0.5,0.9,0.99 --replicates 20 --output data/sweep.csv
+'''
+
+import os
+
+#one BLAS/OpenMP thread per process, the processes already use every core.
+#Set before numpy is imported, spawned workers inherit them
+for variable in ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                 'NUMEXPR_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS']:
+    os.environ.setdefault(variable, '1')
+
+import argparse
+import ast
+import contextlib
+import csv
+import itertools
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from config import Configuration
+
+#columns of the output besides the swept parameters
+RESULT_FIELDS = ['task', 'replicate', 'seed', 'frames', 'susceptible', 'infectious',
+                 'recovered', 'fatalities', 'peak_infectious', 'peak_infectious_frame']
+
+
+def build_grid(grid):
+    '''returns every combination of the values in grid
+
+    Keyword arguments
+    -----------------
+    grid : dict
+        parameter names mapped to the list of values to sweep over
+
+    Returns
+    -------
+    points : list of dict
+        one dict of parameter values per point, the last parameter varies fastest
+    '''
+
+    names = list(grid.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*[grid[name] for name in names])]
+
+
+def get_config_values(base_config):
+    '''returns the values of a Configuration, or a copy of a dict of values'''
+    if isinstance(base_config, Configuration):
+        return dict(base_config.__dict__)
+    return dict(base_config)
+
+
+def run_headless(config_values, seed):
+    '''runs one simulation headless and returns it
+
+    Visualisation, verbose reporting and saving are turned off and console
+    output is discarded. If a lockdown is set, who complies is drawn anew
+    from the seed and the configured lockdown_compliance, so compliance can
+    be swept.
+
+    Keyword arguments
+    -----------------
+    config_values : dict
+        the configuration of the simulation, see Configuration
+
+    seed : int
+        seed for numpy's random number generator
+    '''
+
+    #imported here so the parent process does not need to load the simulation
+    from simulation import Simulation
+
+    config_values = dict(config_values, visualise = False, verbose = False,
+                         save_data = False, save_pop = False, save_plot = False)
+
+    np.random.seed(seed)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        sim = Simulation(**config_values)
+        if sim.Config.lockdown:
+            sim.Config.set_lockdown(sim.Config.lockdown_percentage, sim.Config.lockdown_compliance)
+        sim.run()
+
+    return sim
+
+
+def run_point(config_values, seed):
+    '''runs one simulation headless and returns its outcomes
+
+    Runs in the worker processes, see run_headless for the arguments.
+
+    Returns
+    -------
+    outcomes : dict
+        the number of frames taken, the final susceptible, infectious,
+        recovered and fatalities, and the height and frame of the infection peak
+    '''
+
+    sim = run_headless(config_values, seed)
+    tracker = sim.pop_tracker
+    return {'frames': sim.frame,
+            'susceptible': tracker.susceptible[-1],
+            'infectious': tracker.infectious[-1],
+            'recovered': tracker.recovered[-1],
+            'fatalities': tracker.fatalities[-1],
+            'peak_infectious': tracker.peak_infectious,
+            'peak_infectious_frame': tracker.peak_infectious_frame}
+
+
+def sweep(base_config, grid, output='sweep.csv', replicates=1, seed=0, workers=None):
+    '''runs the base configuration for every point of the grid, on all cores
+
+    Every point is run replicates times, each run as a task on a pool of
+    worker processes with a seed of its own, spawned from seed so the sweep
+    is reproducible. Outcomes are appended to one csv file as tasks finish,
+    so results are kept if the sweep is stopped early; the task column gives
+    the original order.
+
+    Keyword arguments
+    -----------------
+    base_config : Configuration or dict
+        the scenario, values in the grid override it. A Configuration passes
+        all its values, including those derived from others (such as xbounds
+        from world_size), so sweep those along or pass a dict of only the
+        values to set
+
+    grid : dict
+        parameter names mapped to the list of values to sweep over
+
+    output : str
+        path of the csv file to write
+
+    replicates : int
+        the number of runs for every point of the grid
+
+    seed : int
+        seed from which the seeds of all tasks are derived
+
+    workers : int
+        the number of worker processes, defaults to the number of cores
+
+    Returns
+    -------
+    results : list of dict
+        one row per task, as written to the csv, in task order
+    '''
+
+    base_values = get_config_values(base_config)
+
+    points = build_grid(grid)
+    tasks = [(point, replicate) for point in points for replicate in range(replicates)]
+    seeds = [int(child.generate_state(1)[0])
+             for child in np.random.SeedSequence(seed).spawn(len(tasks))]
+
+    fieldnames = list(grid.keys()) + RESULT_FIELDS
+    results = []
+
+    #spawn, so workers start clean in stead of inheriting the parent's imports and threads
+    context = multiprocessing.get_context('spawn')
+
+    with open(output, 'w', newline='') as csv_file, \
+         ProcessPoolExecutor(max_workers = workers or os.cpu_count(), mp_context = context) as executor:
+        writer = csv.DictWriter(csv_file, fieldnames = fieldnames)
+        writer.writeheader()
+        csv_file.flush()
+
+        futures = {executor.submit(run_point, dict(base_values, **point), seeds[task]): task
+                   for task, (point, replicate) in enumerate(tasks)}
+
+        for future in as_completed(futures):
+            task = futures[future]
+            point, replicate = tasks[task]
+
+            row = dict(point, task = task, replicate = replicate, seed = seeds[task])
+            row.update(future.result())
+            writer.writerow(row)
+            csv_file.flush()
+            results.append(row)
+
+            sys.stdout.write('\r%i of %i tasks done' %(len(results), len(tasks)))
+
+    print('')
+    return sorted(results, key = lambda row: row['task'])
+
+
+def parse_value(text):
+    '''reads a command line value as a python literal, or keeps it as a string'''
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+def parse_list(text):
+    '''reads comma separated command line values, each as in parse_value'''
+    try:
+        #top level commas only, so values can be lists themselves
+        return list(ast.literal_eval('[%s]' %text))
+    except (ValueError, SyntaxError):
+        return [parse_value(value) for value in text.split(',')]
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description = 'run a simulation scenario for every point of a parameter grid')
+    parser.add_argument('--grid', action = 'append', default = [], metavar = 'NAME=V1,V2,...',
+                        help = 'configuration value to sweep over, can be given more than once')
+    parser.add_argument('--set', action = 'append', default = [], metavar = 'NAME=VALUE',
+                        help = 'configuration value of the base scenario, can be given more than once')
+    parser.add_argument('--replicates', type = int, default = 1, help = 'runs per grid point')
+    parser.add_argument('--seed', type = int, default = 0, help = 'seed the seeds of all runs are derived from')
+    parser.add_argument('--workers', type = int, default = None, help = 'worker processes, defaults to all cores')
+    parser.add_argument('--output', default = 'sweep.csv', help = 'csv file to write results to')
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    args = parse_args(args)
+
+    base_values = {}
+    for setting in args.set:
+        name, value = setting.split('=', 1)
+        base_values[name] = parse_value(value)
+
+    grid = {}
+    for setting in args.grid:
+        name, values = setting.split('=', 1)
+        grid[name] = parse_list(values)
+
+    sweep(base_values, grid, output = args.output, replicates = args.replicates,
+          seed = args.seed, workers = args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+'''
+makes the modules in the repository root importable from the tests
+'''
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+
+from config import Configuration
+from population import initialize_population
+
+
+def count_nearby_brute_force(source_xy, target_xy, infection_range):
+    '''counts the sources within the open infection zone of every target, testing all pairs'''
+    dx = np.abs(source_xy[np.newaxis,:,0] - target_xy[:,np.newaxis,0])
+    dy = np.abs(source_xy[np.newaxis,:,1] - target_xy[:,np.newaxis,1])
+    return np.count_nonzero((dx < infection_range) & (dy < infection_range), axis=1)
+
+
+def find_nearby_brute_force(population, infection_range, traveling_infects=False, exclude=None):
+    '''the healthy with infectious people in range and their numbers, testing all pairs'''
+    infectious = population[:,6] == 1
+    if not traveling_infects:
+        infectious &= population[:,11] == 0
+    healthy = population[:,6] == 0
+    if exclude is not None:
+        infectious &= ~exclude
+        healthy &= ~exclude
+
+    targets = np.flatnonzero(healthy)
+    counts = count_nearby_brute_force(population[infectious][:,1:3], population[targets][:,1:3],
+                                      infection_range)
+    return targets[counts > 0], counts[counts > 0]
+
+
+@pytest.fixture
+def brute_force():
+    return find_nearby_brute_force
+
+
+@pytest.fixture
+def mixed_population():
+    '''a population of healthy, sick, immune and dead, some with destinations, some on cell edges'''
+    np.random.seed(5)
+    Config = Configuration(pop_size = 2000, verbose = False)
+    population = initialize_population(Config)
+    population[:,6] = np.random.choice(4, size = 2000, p = [0.6, 0.25, 0.1, 0.05])
+    population[np.random.random(2000) < 0.2,11] = 1
+
+    #people on multiples of the infection range, where cell edges and zone edges meet
+    lattice = np.random.randint(0, 20, size = (200, 2)) * 0.05
+    population[:200,1:3] = lattice
+    return population
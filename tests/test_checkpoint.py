@@ -0,0 +1,58 @@
+'''
+tests of saving and restoring simulations, see checkpoint.py
+'''
+
+import numpy as np
+import pytest
+
+from schedules import Daily_schedule
+from simulation import Simulation
+
+
+def make_simulation(case, path):
+    '''a simulation of the given case that checkpoints to path at frame 200'''
+    np.random.seed(7)
+    sim = Simulation(pop_size = 400, world_size = [1, 1], simulation_steps = 350, infection_range = 0.03,
+                     checkpoint_freq = 200, checkpoint_path = str(path), visualise = False, verbose = False,
+                     **case.get('config', {}))
+
+    if case.get('lockdown'):
+        sim.Config.set_lockdown(lockdown_percentage = 0.05, lockdown_compliance = 0.9)
+    if case.get('self_isolate'):
+        sim.Config.set_self_isolation(self_isolate_proportion = 0.6,
+                                      isolation_bounds = [0.02, 0.02, 0.1, 0.98])
+    if case.get('schedule'):
+        home = sim.destinations.add_destination(0.2, 0.2, 0.4, 0.4)
+        work = sim.destinations.add_destination(0.6, 0.6, 0.9, 0.9)
+        sim.schedule = Daily_schedule([[0, home, home, 0], [work, work, 0, 0]],
+                                      np.random.randint(0, 2, size = 400), slot_length = 20)
+    return sim
+
+
+@pytest.mark.parametrize('case', [{},
+                                  {'config': {'infection_engine': 'grid', 'motion_engine': 'fused'}},
+                                  {'lockdown': True},
+                                  {'self_isolate': True, 'config': {'destination_storage': 'registry'}},
+                                  {'schedule': True, 'config': {'destination_storage': 'registry',
+                                                                'traveling_infects': True}}])
+def test_resume_is_bit_identical(case, tmp_path, capsys):
+    path = tmp_path / 'checkpoint.npz'
+
+    #the uninterrupted run, which also writes a checkpoint at frame 200
+    sim = make_simulation(case, path)
+    sim.run()
+    assert sim.pop_tracker.recovered[-1] + sim.pop_tracker.infectious[-1] > 0
+
+    #resume from frame 200, with numpy's generator moved on in the meantime
+    np.random.seed(123)
+    resumed = Simulation.from_checkpoint(str(path))
+    assert resumed.frame == 200
+    resumed.run()
+    capsys.readouterr()
+
+    assert resumed.frame == sim.frame
+    assert np.array_equal(resumed.population, sim.population)
+    assert np.array_equal(resumed.pop_tracker.counts[:resumed.pop_tracker.length],
+                          sim.pop_tracker.counts[:sim.pop_tracker.length])
+    for state in range(5):
+        assert np.array_equal(resumed.pop_index.get(state), sim.pop_index.get(state))
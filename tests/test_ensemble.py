@@ -0,0 +1,68 @@
+'''
+tests of the ensemble mode, see ensemble.Ensemble
+'''
+
+import numpy as np
+
+from ensemble import Ensemble
+
+
+def test_infections_stay_within_replicas(brute_force):
+    np.random.seed(3)
+    ensemble = Ensemble(replicas = 3, pop_size = 400, infection_range = 0.1, infection_chance = 1.0,
+                        healthcare_capacity = 1000, verbose = False)
+    #replicas share one area, so infections across replicas would be found too
+    ensemble.population[:,:,6] = np.random.choice(4, size = (3, 400), p = [0.7, 0.2, 0.05, 0.05])
+    ensemble.population[:,:,11] = np.random.random((3, 400)) < 0.2
+    before = ensemble.population.copy()
+
+    ensemble.infect()
+
+    for replica in range(3):
+        #every exposed person is infected, as infection_chance is 1
+        expected, _ = brute_force(before[replica], 0.1)
+        infected = np.flatnonzero((before[replica,:,6] == 0) & (ensemble.population[replica,:,6] == 1))
+        assert np.array_equal(infected, expected)
+        assert np.all(ensemble.population[replica,infected,8] == 0)
+
+
+def test_admission_per_replica():
+    np.random.seed(4)
+    ensemble = Ensemble(replicas = 2, pop_size = 300, world_size = [1, 1], infection_range = 0.2,
+                        infection_chance = 1.0, healthcare_capacity = 5, verbose = False)
+    ensemble.population[:,:,6] = 0
+    ensemble.population[:,:20,6] = 1
+    #three beds are taken in replica 0, none in replica 1
+    ensemble.population[0,:3,10] = 1
+    before = ensemble.population.copy()
+
+    ensemble.infect()
+
+    for replica, taken in [(0, 3), (1, 0)]:
+        infected = np.flatnonzero((before[replica,:,6] == 0) & (ensemble.population[replica,:,6] == 1))
+        admitted = np.flatnonzero((before[replica,:,10] == 0) & (ensemble.population[replica,:,10] == 1))
+        #admitted in order of ID, as many as infect_exposed would admit
+        beds = 5 - taken + 1
+        assert len(infected) > beds
+        assert np.array_equal(admitted, infected[:beds])
+
+
+def test_lockdown_per_replica(capsys):
+    np.random.seed(5)
+    ensemble = Ensemble(replicas = 2, pop_size = 300, lockdown = True, lockdown_percentage = 0.1,
+                        lockdown_compliance = 0.8, verbose = False)
+    ensemble.population[:,:,6] = 0
+    #only replica 0 is above the lockdown threshold
+    ensemble.population[0,:60,6] = 1
+    ensemble.population[0,:60,8] = 0
+
+    ensemble.tstep()
+    capsys.readouterr()
+
+    speeds = ensemble.population[:,:,5]
+    assert np.all(speeds[0] <= 0.001)
+    assert np.all(speeds[0,ensemble.complying[0]] == 0)
+    assert np.any(speeds[1] > 0.001)
+    assert np.any(speeds[1,ensemble.complying[1]] > 0)
+    #both replicas draw their own compliance, close to the configured share
+    assert np.all(np.abs(ensemble.complying.mean(axis=1) - 0.8) < 0.1)
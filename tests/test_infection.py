@@ -0,0 +1,98 @@
+'''
+tests of finding exposures, infections, recoveries and deaths, see infection.py
+'''
+
+import numpy as np
+import pytest
+
+from config import Configuration
+from infection import infect, find_venue_exposed, find_nearby_grid, count_nearby_grid, recover_or_die,\
+Recovery_scheduler
+from population import initialize_population, initialize_destination_matrix, Population_index
+
+
+def test_infected_by_hand_recovers():
+    np.random.seed(0)
+    Config = Configuration(pop_size = 50, verbose = False, recovery_duration = (10, 20))
+    population = initialize_population(Config)
+    scheduler = Recovery_scheduler(Config)
+
+    #infected directly in the matrix, without telling the scheduler
+    population[:5,6] = 1
+    population[:5,8] = 0
+
+    for frame in range(25):
+        population = recover_or_die(population, frame, Config, scheduler = scheduler)
+
+    assert np.all(np.isin(population[:5,6], [2, 3]))
+    assert np.all(population[5:,6] == 0)
+
+
+def test_infected_through_the_index_recover():
+    np.random.seed(0)
+    Config = Configuration(pop_size = 50, verbose = False, recovery_duration = (10, 20))
+    population = initialize_population(Config)
+    pop_index = Population_index(population)
+    scheduler = Recovery_scheduler(Config)
+
+    population[:5,6] = 1
+    population[:5,8] = 0
+    pop_index.set_state(np.arange(5), 1)
+
+    population = recover_or_die(population, 0, Config, scheduler = scheduler, pop_index = pop_index)
+    assert np.all(scheduler.scheduled[:5])
+    assert len(pop_index.take_new_infected()) == 0
+
+    for frame in range(1, 25):
+        population = recover_or_die(population, frame, Config, scheduler = scheduler, pop_index = pop_index)
+
+    assert np.all(np.isin(population[:5,6], [2, 3]))
+    assert pop_index.count(1) == 0
+    assert pop_index.count(2) + pop_index.count(3) == 5
+
+
+@pytest.mark.parametrize('traveling_infects', [False, True])
+def test_grid_search_matches_brute_force(mixed_population, brute_force, traveling_infects):
+    population = mixed_population
+    exclude = np.random.random(len(population)) < 0.1
+
+    for index, mask in [(None, None), (Population_index(population), None), (None, exclude)]:
+        indices, counts = find_nearby_grid(population, 0.05, traveling_infects = traveling_infects,
+                                           pop_index = index, exclude = mask)
+        expected_indices, expected_counts = brute_force(population, 0.05, traveling_infects, mask)
+
+        order = np.argsort(indices)
+        assert np.array_equal(indices[order], expected_indices)
+        assert np.array_equal(counts[order], expected_counts)
+
+
+def test_grid_zone_is_open():
+    #exactly infection_range apart on one axis is out of range, as in find_nearby
+    source_xy = np.array([[0.5, 0.5]])
+    target_xy = np.array([[0.5, 0.75], [0.75, 0.5], [0.7, 0.7], [0.25, 0.3]])
+    assert np.array_equal(count_nearby_grid(source_xy, target_xy, 0.25), [0, 0, 1, 0])
+
+
+def test_venues_need_a_registry():
+    Config = Configuration(pop_size = 50, verbose = False, venue_transmission = True)
+    population = initialize_population(Config)
+    destinations = initialize_destination_matrix(Config.pop_size, 1)
+
+    with pytest.raises(ValueError, match='Destination_registry'):
+        infect(population, Config, 0, destinations = destinations)
+
+
+def test_venue_exposure_per_registry_destination():
+    np.random.seed(0)
+    Config = Configuration(pop_size = 50, verbose = False, venue_transmission = True)
+    population = initialize_population(Config)
+
+    #two venues, one with an infectious person
+    population[:10,11] = 1
+    population[10:20,11] = 2
+    population[:20,12] = 1
+    population[0,6] = 1
+
+    indices, infected_counts = find_venue_exposed(population)
+    assert np.array_equal(np.sort(indices), np.arange(1, 10))
+    assert np.all(infected_counts == 1)
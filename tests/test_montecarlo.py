@@ -0,0 +1,106 @@
+'''
+tests of the streaming summaries of the Monte Carlo runner, see montecarlo.py
+'''
+
+import numpy as np
+import pytest
+
+from montecarlo import Curve_summary, P2_quantile, Running_moments, run_until_converged,\
+student_t_factor
+
+#a small scenario whose outcome differs from seed to seed
+SCENARIO = {'pop_size': 100, 'world_size': [1, 1], 'simulation_steps': 60,
+            'infection_range': 0.1, 'infection_chance': 0.5}
+
+
+def test_running_moments_match_numpy():
+    values = np.random.default_rng(0).normal(size=(50, 3))
+    moments = Running_moments((3,))
+    for row in values:
+        moments.add(row)
+
+    assert np.allclose(moments.mean, values.mean(axis=0))
+    assert np.allclose(moments.variance, values.var(axis=0, ddof=1))
+
+
+def test_bands_are_exact_for_few_runs():
+    rng = np.random.default_rng(1)
+    quantiles = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+    for runs in [1, 6, 30]:
+        curves = rng.integers(0, 1000, size=(runs, 20, 4))
+        summary = Curve_summary(20, quantiles)
+        for counts in curves:
+            summary.add_run(counts)
+
+        for quantile in quantiles:
+            assert np.allclose(summary.percentile(quantile), np.quantile(curves, quantile, axis=0))
+        #the widest band holds the mean
+        assert np.all(summary.percentile(0.05) <= summary.mean)
+        assert np.all(summary.percentile(0.95) >= summary.mean)
+
+
+def test_bands_follow_numpy_for_many_runs():
+    rng = np.random.default_rng(2)
+    curves = rng.lognormal(mean = 5, size=(400, 10, 4))
+    summary = Curve_summary(10)
+    for counts in curves:
+        summary.add_run(counts)
+
+    bands = [summary.percentile(quantile) for quantile in summary.quantiles]
+    for quantile, band in zip(summary.quantiles, bands):
+        exact = np.quantile(curves, quantile, axis=0)
+        assert np.median(np.abs(band / exact - 1)) < 0.05
+    #bands are in order
+    assert np.all(np.diff(bands, axis=0) >= 0)
+
+
+def test_p2_quantile_exact_until_started():
+    values = np.random.default_rng(3).normal(size=(40,))
+    sketch = P2_quantile((), 0.9, exact_until=30)
+    for i, value in enumerate(values):
+        sketch.add(value)
+        if i < 30:
+            assert np.isclose(sketch.value, np.quantile(values[:i + 1], 0.9))
+    assert sketch.started
+
+
+def test_p2_quantile_of_floats():
+    sketch = P2_quantile((), 0.5, exact_until=3)
+    for value in [1.0, 5.0, 2.0, 4.0, 3.0, 6.0]:
+        sketch.add(value)
+    assert sketch.started
+    assert 1 <= sketch.value <= 6
+
+
+def test_unknown_quantiles_are_rejected():
+    summary = Curve_summary(5, [0.25, 0.75], exact_until=5)
+    for runs in [0, 3, 10]:
+        while summary.runs < runs:
+            summary.add_run(np.ones((5, 4)) * summary.runs)
+        with pytest.raises(ValueError, match='not kept'):
+            summary.percentile(0.5)
+
+
+@pytest.mark.parametrize('confidence, dof, expected', [(0.95, 1, 12.706), (0.95, 2, 4.303),
+                                                       (0.95, 9, 2.262), (0.99, 9, 3.250),
+                                                       (0.95, 29, 2.045), (0.95, 1000, 1.962)])
+def test_student_t_factor_matches_tables(confidence, dof, expected):
+    assert abs(student_t_factor(confidence, dof) - expected) < 1e-3
+
+
+def test_converged_runs_stop(capsys):
+    estimate = run_until_converged(SCENARIO, 'infectious', tolerance = 1000, min_runs = 3,
+                                   max_runs = 50, workers = 2)
+    assert estimate['converged']
+    assert estimate['runs'] == 3
+    assert estimate['half_width'] <= 1000
+
+
+def test_runs_stop_at_max_runs(capsys):
+    estimate = run_until_converged(SCENARIO, 'infectious', tolerance = 0.01, min_runs = 2,
+                                   max_runs = 6, workers = 2)
+    assert not estimate['converged']
+    assert estimate['runs'] == 6
+    #the interval of the t distribution with 5 degrees of freedom
+    assert np.isclose(estimate['half_width'], 2.571 * estimate['std'] / np.sqrt(6), rtol = 1e-3)
@@ -0,0 +1,45 @@
+'''
+tests of the fused motion step, see motion.update_motion
+'''
+
+import numpy as np
+import pytest
+
+from config import Configuration
+from motion import Motion_buffers, update_motion
+from parallel import Tile_pool
+from population import initialize_population
+
+
+@pytest.mark.parametrize('threads', [1, 2])
+def test_lockdown_vector_changes_take_effect(threads):
+    np.random.seed(0)
+    Config = Configuration(pop_size = 100, threads = threads, verbose = False)
+    population = initialize_population(Config)
+    population[:,5] = 0.01
+    lockdown_vector = np.ones((100,))
+    lockdown_vector[:50] = 0
+
+    buffers = Motion_buffers(100)
+    tile_pool = Tile_pool(Config)
+    rng = np.random.default_rng(0)
+
+    def move(frame):
+        if threads == 1:
+            update_motion(population, buffers, [0, 2], [0, 2], rng, lockdown = True,
+                          lockdown_vector = lockdown_vector)
+        else:
+            tile_pool.move(population, [0, 2], [0, 2], frame, lockdown = True,
+                           lockdown_vector = lockdown_vector)
+
+    move(0)
+    assert np.all(population[:50,5] == 0)
+    assert np.all(population[50:,5] == 0.001)
+
+    #half of those who did not comply now do, after the buffers were made
+    lockdown_vector[50:75] = 0
+    move(1)
+    assert np.all(population[:75,5] == 0)
+    assert np.all(population[75:,5] == 0.001)
+
+    tile_pool.shutdown()
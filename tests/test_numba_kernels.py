@@ -0,0 +1,49 @@
+'''
+tests of the compiled kernels of the numba backend, see numba_kernels.py
+'''
+
+import warnings
+
+import numpy as np
+import pytest
+
+import numba_kernels
+from config import Configuration
+from numba_kernels import NUMBA_AVAILABLE, count_nearby_kernel, find_nearby_numba, get_backend
+from population import Population_index
+
+needs_numba = pytest.mark.skipif(not NUMBA_AVAILABLE, reason = 'numba is not installed')
+
+
+@needs_numba
+@pytest.mark.parametrize('traveling_infects', [False, True])
+def test_numba_search_matches_brute_force(mixed_population, brute_force, traveling_infects):
+    population = mixed_population
+    exclude = np.random.random(len(population)) < 0.1
+
+    for index, mask in [(None, None), (Population_index(population), None), (None, exclude)]:
+        indices, counts = find_nearby_numba(population, 0.05, traveling_infects = traveling_infects,
+                                            pop_index = index, exclude = mask)
+        expected_indices, expected_counts = brute_force(population, 0.05, traveling_infects, mask)
+
+        order = np.argsort(indices)
+        assert np.array_equal(indices[order], expected_indices)
+        assert np.array_equal(counts[order], expected_counts)
+
+
+@needs_numba
+def test_numba_zone_is_open():
+    source_xy = np.array([[0.5, 0.5]])
+    target_xy = np.array([[0.5, 0.75], [0.75, 0.5], [0.7, 0.7], [0.25, 0.3]])
+    assert np.array_equal(count_nearby_kernel(source_xy, target_xy, 0.25), [0, 0, 1, 0])
+
+
+def test_backend_falls_back_without_numba(monkeypatch):
+    monkeypatch.setattr(numba_kernels, 'NUMBA_AVAILABLE', False)
+    Config = Configuration(backend = 'numba', verbose = False)
+
+    with pytest.warns(UserWarning, match='numba is not installed'):
+        assert get_backend(Config) == 'numpy'
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        assert get_backend(Configuration(verbose = False)) == 'numpy'
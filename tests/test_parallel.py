@@ -0,0 +1,54 @@
+'''
+tests of the multi-threaded timestep, see parallel.Tile_pool
+'''
+
+import numpy as np
+import pytest
+
+from config import Configuration
+from numba_kernels import NUMBA_AVAILABLE
+from parallel import Tile_pool
+from population import Population_index
+
+backends = ['numpy', pytest.param('numba', marks = pytest.mark.skipif(not NUMBA_AVAILABLE,
+                                                                       reason = 'numba is not installed'))]
+
+
+@pytest.mark.parametrize('backend', backends)
+@pytest.mark.parametrize('threads', [1, 3, 4])
+def test_tiled_search_matches_brute_force(mixed_population, brute_force, threads, backend):
+    population = mixed_population
+    exclude = np.random.random(len(population)) < 0.1
+    tile_pool = Tile_pool(Configuration(pop_size = len(population), threads = threads, verbose = False))
+
+    try:
+        for traveling_infects in [False, True]:
+            for index, mask in [(None, None), (Population_index(population), None), (None, exclude)]:
+                indices, counts = tile_pool.find_nearby(population, 0.05,
+                                                        traveling_infects = traveling_infects,
+                                                        pop_index = index, exclude = mask,
+                                                        backend = backend)
+                expected_indices, expected_counts = brute_force(population, 0.05,
+                                                                traveling_infects, mask)
+
+                order = np.argsort(indices)
+                assert np.array_equal(indices[order], expected_indices)
+                assert np.array_equal(counts[order], expected_counts)
+    finally:
+        tile_pool.shutdown()
+
+
+def test_tiled_motion_is_reproducible(mixed_population):
+    Config = Configuration(pop_size = len(mixed_population), threads = 4, verbose = False)
+    moved = []
+    for i in range(2):
+        population = mixed_population.copy()
+        tile_pool = Tile_pool(Config, seed = 3)
+        for frame in range(5):
+            tile_pool.move(population, [0.02, 1.98], [0.02, 1.98], frame,
+                           stopped = np.flatnonzero(population[:,6] == 3))
+        tile_pool.shutdown()
+        moved.append(population)
+
+    assert np.array_equal(moved[0], moved[1])
+    assert not np.array_equal(moved[0], mixed_population)
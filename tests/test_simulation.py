@@ -0,0 +1,120 @@
+'''
+tests of running the simulation, see simulation.Simulation
+'''
+
+import numpy as np
+import pytest
+
+from config import config_error
+from population import Destination_registry, initialize_destination_matrix
+from schedules import Daily_schedule
+from simulation import Simulation
+
+
+class Callback_simulation(Simulation):
+    '''infects the first people at frame 1, editing the population directly'''
+    def callback(self):
+        if self.frame == 1:
+            self.population[:5,6] = 1
+            self.population[:5,8] = 1
+            self.pop_index.mark_changed()
+
+
+class Index_callback_simulation(Simulation):
+    '''infects the first people at frame 1 through the population index'''
+    def callback(self):
+        if self.frame == 1:
+            self.population[:5,6] = 1
+            self.population[:5,8] = 1
+            self.pop_index.set_state(np.arange(5), 1)
+
+
+def run_quietly(sim, capsys):
+    sim.run()
+    capsys.readouterr()
+
+
+@pytest.mark.parametrize('simulation', [Callback_simulation, Index_callback_simulation])
+def test_callback_infections_spread(simulation, capsys):
+    np.random.seed(1)
+    sim = simulation(pop_size = 300, world_size = [1, 1], simulation_steps = 2000,
+                              infection_range = 0.03, recovery_duration = (50, 100),
+                              household_transmission = False, visualise = False, verbose = False)
+    run_quietly(sim, capsys)
+
+    #the epidemic took off and ran its course, in stead of stopping at frame 500
+    assert sim.pop_tracker.recovered[-1] + sim.pop_tracker.fatalities[-1] > 50
+    assert sim.pop_tracker.infectious[-1] == 0
+
+    #the index agrees with the population
+    for state in range(5):
+        assert np.array_equal(np.sort(sim.pop_index.get(state)),
+                              np.flatnonzero(sim.population[:,6] == state))
+
+
+def test_recovered_keep_their_schedule(capsys):
+    np.random.seed(2)
+    sim = Simulation(pop_size = 300, simulation_steps = 700, destination_storage = 'registry',
+                     traveling_infects = True, infection_range = 0.05, recovery_duration = (20, 40),
+                     visualise = False, verbose = False)
+    home = sim.destinations.add_destination(0.2, 0.2, 0.6, 0.6)
+    work = sim.destinations.add_destination(1.2, 1.2, 1.6, 1.6)
+    assert sim.isolation_location not in [home, work]
+    sim.schedule = Daily_schedule([[home, work]], np.zeros((300,), dtype=int), slot_length = 100)
+    run_quietly(sim, capsys)
+
+    recovered = sim.population[:,6] == 2
+    assert recovered.sum() > 0
+
+    #everyone recovered is still heading to or at the destination of the current slot
+    slot_destination = sim.schedule.destinations_at(sim.schedule.current_slot)
+    assert np.all(np.isin(slot_destination, [home, work]))
+    assert np.all(sim.population[recovered,11] == slot_destination[recovered])
+
+
+def test_schedules_cannot_use_the_isolation_location():
+    sim = Simulation(pop_size = 100, destination_storage = 'registry', visualise = False)
+    with pytest.raises(config_error, match='reserved for self-isolation'):
+        sim.schedule = Daily_schedule([[0, sim.isolation_location]], np.zeros((100,), dtype=int))
+
+
+def test_schedules_fit_the_destination_matrix(capsys):
+    sim = Simulation(pop_size = 100, visualise = False)
+    with pytest.raises(config_error, match='destination matrix holds 1'):
+        sim.schedule = Daily_schedule([[0, 2]], np.zeros((100,), dtype=int))
+
+    #with room for the destinations, the schedule runs
+    np.random.seed(3)
+    sim.destinations = initialize_destination_matrix(100, 3)
+    sim.destinations[:,2:6] = [0.5, 0.5, 1.5, 1.5]
+    sim.schedule = Daily_schedule([[0, 2, 3]], np.zeros((100,), dtype=int), slot_length = 10)
+    sim.Config.simulation_steps = 40
+    sim.Config.verbose = False
+    run_quietly(sim, capsys)
+    assert np.all(np.isin(sim.population[:,11], [0, 2, 3]))
+
+
+def test_float32_fits_ids_and_frames(capsys):
+    with pytest.raises(config_error, match='precision float32'):
+        Simulation(pop_size = 2**24 + 2, precision = 'float32', visualise = False)
+    with pytest.raises(config_error, match='precision float32'):
+        Simulation(pop_size = 100, simulation_steps = 2**24 + 2, precision = 'float32', visualise = False)
+
+    #runs go on from the frame reached before
+    sim = Simulation(pop_size = 100, simulation_steps = 10, precision = 'float32', visualise = False)
+    sim.frame = 2**24 - 5
+    with pytest.raises(config_error, match='precision float32'):
+        sim.run()
+
+    #float64 holds far more
+    Simulation(pop_size = 100, simulation_steps = 2**24 + 2, visualise = False)
+
+
+def test_venues_need_a_registry():
+    with pytest.raises(config_error, match='venue transmission'):
+        Simulation(pop_size = 100, venue_transmission = True, visualise = False)
+
+    #storage names are not case sensitive, as the other options
+    sim = Simulation(pop_size = 100, venue_transmission = True, destination_storage = 'Registry',
+                     visualise = False)
+    assert isinstance(sim.destinations, Destination_registry)
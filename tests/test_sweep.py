@@ -0,0 +1,65 @@
+'''
+tests of the parameter sweep runner, see sweep.py
+'''
+
+import csv
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from numba_kernels import NUMBA_AVAILABLE
+from sweep import RESULT_FIELDS, parse_list, run_point, sweep
+
+#a small scenario whose outcome differs from seed to seed
+SCENARIO = {'pop_size': 100, 'world_size': [1, 1], 'simulation_steps': 60, 'infection_range': 0.1}
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_sweep_writes_every_task(tmp_path, capsys):
+    output = str(tmp_path / 'sweep.csv')
+    results = sweep(SCENARIO, {'infection_chance': [0.2, 0.6]}, output = output,
+                    replicates = 2, seed = 11, workers = 2)
+    capsys.readouterr()
+
+    with open(output, newline='') as csv_file:
+        reader = csv.DictReader(csv_file)
+        assert reader.fieldnames == ['infection_chance'] + RESULT_FIELDS
+        rows = sorted(reader, key = lambda row: int(row['task']))
+
+    #one row per point and replicate, the last parameter varies fastest
+    assert [(float(row['infection_chance']), int(row['replicate'])) for row in rows] == \
+           [(0.2, 0), (0.2, 1), (0.6, 0), (0.6, 1)]
+
+    #every task has its own seed, spawned from the seed of the sweep
+    seeds = [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(11).spawn(4)]
+    assert [int(row['seed']) for row in rows] == seeds
+    assert [row['seed'] for row in results] == seeds
+
+    #and a task gives the same outcome when run again from its seed
+    outcomes = run_point(dict(SCENARIO, infection_chance = 0.6), seeds[3])
+    for field in RESULT_FIELDS[RESULT_FIELDS.index('frames'):]:
+        assert int(rows[3][field]) == outcomes[field]
+
+
+@pytest.mark.parametrize('backend', ['numpy', pytest.param('numba', marks = pytest.mark.skipif(
+                                     not NUMBA_AVAILABLE, reason = 'numba is not installed'))])
+def test_workers_import_numba_only_when_asked(backend):
+    #what a spawned worker does: import sweep and run a point
+    code = ('import sys\n'
+            'from sweep import run_point\n'
+            'run_point(dict(%r, backend = %r), 0)\n'
+            'print(\'numba\' in sys.modules)' %(SCENARIO, backend))
+    result = subprocess.run([sys.executable, '-c', code], cwd = REPOSITORY, capture_output = True,
+                            text = True, check = True)
+
+    assert result.stdout.strip() == str(backend == 'numba')
+
+
+def test_parse_list():
+    assert parse_list('0.1,0.5') == [0.1, 0.5]
+    assert parse_list('[1,1],[2,2]') == [[1, 1], [2, 2]]
+    assert parse_list('grid,meanfield') == ['grid', 'meanfield']
@@ -38,7 +38,7 @@ def build_fig(Config, figsize=(5,7)):
 
 
 def draw_tstep(Config, population, pop_tracker, frame,
-               fig, spec, ax1, ax2):
+               fig, spec, ax1, ax2, pop_index=None):
     #construct plot and visualise
 
     #set plot style
@@ -60,16 +60,22 @@ def draw_tstep(Config, population, pop_tracker, frame,
                        addcross = False)
         
     #plot population segments
-    healthy = population[population[:,6] == 0][:,1:3]
+    if pop_index is not None:
+        #slice states directly if an index is kept
+        segments = [population[pop_index.get(state),1:3] for state in range(4)]
+    else:
+        segments = [population[population[:,6] == state][:,1:3] for state in range(4)]
+
+    healthy = segments[0]
     ax1.scatter(healthy[:,0], healthy[:,1], color=palette[0], s = 2, label='healthy')
     
-    infected = population[population[:,6] == 1][:,1:3]
+    infected = segments[1]
     ax1.scatter(infected[:,0], infected[:,1], color=palette[1], s = 2, label='infected')
 
-    immune = population[population[:,6] == 2][:,1:3]
+    immune = segments[2]
     ax1.scatter(immune[:,0], immune[:,1], color=palette[2], s = 2, label='immune')
     
-    fatalities = population[population[:,6] == 3][:,1:3]
+    fatalities = segments[3]
     ax1.scatter(fatalities[:,0], fatalities[:,1], color=palette[3], s = 2, label='dead')
         
     
@@ -132,7 +138,9 @@ def plot_sir(Config, pop_tracker, size=(6,3), include_fatalities=False,
         the configuration class
         
     pop_tracker : ndarray
-        the population tracker, containing
+        the population tracker, containing the curves. If it has bands (as
+        montecarlo.Curve_summary), the areas between these quantiles are
+        shaded around the curves
         
     size : tuple
         size at which the plot will be initialised (default: (6,3))
@@ -150,11 +158,20 @@ def plot_sir(Config, pop_tracker, size=(6,3), include_fatalities=False,
     #plot the thing
     plt.figure(figsize=size)
     plt.title(title)    
-    plt.plot(pop_tracker.susceptible, color=palette[0], label='susceptible')
-    plt.plot(pop_tracker.infectious, color=palette[1], label='infectious')
-    plt.plot(pop_tracker.recovered, color=palette[2], label='recovered')
+    curves = [pop_tracker.susceptible, pop_tracker.infectious, pop_tracker.recovered]
+    labels = ['susceptible', 'infectious', 'recovered']
     if include_fatalities:
-        plt.plot(pop_tracker.fatalities, color=palette[3], label='fatalities')
+        curves.append(pop_tracker.fatalities)
+        labels.append('fatalities')
+
+    for column, (curve, label) in enumerate(zip(curves, labels)):
+        plt.plot(curve, color=palette[column], label=label)
+
+        #shade the bands of an ensemble, overlapping towards the median
+        for low, high in getattr(pop_tracker, 'bands', []):
+            plt.fill_between(np.arange(len(curve)), pop_tracker.percentile(low)[:,column],
+                             pop_tracker.percentile(high)[:,column], color=palette[column],
+                             alpha=0.15, linewidth=0)
         
     #add axis labels
     plt.xlabel('time in hours')